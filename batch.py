@@ -0,0 +1,140 @@
+"""Precompute dashboard artifacts outside Streamlit.
+
+Usage:
+    python batch.py                               # the bundled sample data
+    python batch.py sales.csv --map Sales=Revenue --by Category Region
+    python batch.py sales.parquet --months 3 6 --metrics Sales
+
+Loads a file the same way the Upload page does, then writes the rollup
+cube, forecasts (total and per member of each --by dimension) and anomaly
+tables to .cache/batch/v<schema>/<fingerprint>/.
+Prophet models go to the shared forecast store. The pages read these
+artifacts when the same data is loaded, so run this from cron before the
+morning rush and nobody waits on a Prophet fit.
+"""
+import argparse
+import datetime
+import sys
+import time
+
+import pandas as pd
+
+from helper import (
+    ANOMALY_GRANULARITIES, ANOMALY_METHODS, BATCH_CACHE_DIR, DEFAULT_SEASONALITY, MIN_SERIES_DAYS,
+    anomaly_matrix, auto_rename_columns, batch_artifact_dir, batch_artifact_name, build_dataset, compute_forecast,
+    detect_anomalies, forecast_many, read_sample_data, read_upload_file, split_series, upload_column_map,
+    write_batch_artifact,
+)
+
+# Loosest threshold the Anomalies page offers per method; the page filters the stored scores further
+MIN_THRESHOLDS = {"percent": 10, "rolling_mad": 2.0, "ewma": 2.0, "seasonal": 2.0}
+
+
+def load(path, overrides):
+    """Build the dataset for `path` (or the sample data) with the mapping the Upload page would pick."""
+    if path is None:
+        data = read_sample_data()
+    else:
+        with open(path, "rb") as file:
+            data = auto_rename_columns(read_upload_file(file, path), ["Order Date", "Sales", "Profit", "Product"])
+    # The Upload page's mapping step runs for sample data too, so match the fingerprint it produces
+    column_map = upload_column_map(data)
+    column_map.update(overrides)
+    return build_dataset(data, column_map), path or "sample"
+
+
+def step(message):
+    print(f"[{datetime.datetime.now():%H:%M:%S}] {message}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", nargs="?", help="CSV, Excel, Parquet or Arrow file (default: sample data)")
+    parser.add_argument("--map", nargs="*", default=[], metavar="NAME=COLUMN", help="override the column mapping")
+    parser.add_argument("--metrics", nargs="*", default=["Sales", "Profit"], help="measures to forecast")
+    parser.add_argument("--months", nargs="*", type=int, default=list(range(1, 13)), help="forecast horizons")
+    parser.add_argument("--engine", default="prophet", help="forecast engine (prophet or a fast engine name)")
+    parser.add_argument("--by", nargs="*", default=[], help="dimensions to also forecast and scan per member")
+    parser.add_argument("--top", type=int, default=20, help="largest members per dimension to forecast")
+    parser.add_argument("--timeout", type=int, default=300, help="seconds allowed per series forecast")
+    parser.add_argument("--cache-dir", default=BATCH_CACHE_DIR, help="where artifacts are written")
+    args = parser.parse_args()
+
+    overrides = dict(item.split("=", 1) for item in args.map)
+    started = time.perf_counter()
+    dataset, source = load(args.file, overrides)
+    fingerprint = dataset.fingerprint
+    cube = dataset.cube
+    step(f"Loaded {len(dataset.frame):,} rows from {source} (fingerprint {fingerprint})")
+
+    def save(name, artifact):
+        return write_batch_artifact(fingerprint, name, artifact, args.cache_dir)
+
+    artifacts = []
+    save("rollup", cube.cells.drop(columns=["Month", "Quarter"]))
+    artifacts.append("rollup")
+    step(f"Rollup ({len(cube.cells):,} cells) written")
+
+    dimensions = [name for name in args.by if name in dataset.dimensions]
+    if dataset.dates is not None:
+        for metric in [m for m in args.metrics if m in cube.measures]:
+            history = cube.query(by=["Day"])[f"{metric}_sum"].reset_index()
+            history.columns = ["ds", "y"]
+            for months in args.months:
+                forecast = compute_forecast(history, months, metric, fingerprint, DEFAULT_SEASONALITY, engine=args.engine)
+                name = batch_artifact_name("forecast", metric=metric, months=months, settings=DEFAULT_SEASONALITY, engine=args.engine)
+                save(name, forecast[["ds", "yhat", "yhat_lower", "yhat_upper"]])
+                artifacts.append(name)
+            step(f"{metric} forecasts written for {len(args.months)} horizons")
+
+            # The Forecasting page's batch section reads these for the members it is asked about
+            for dimension in dimensions:
+                series, skipped = split_series(dataset.rollup(dimension), dimension, metric, top=args.top)
+                if skipped:
+                    step(f"  skipped {len(skipped)} {dimension} members with orders on fewer than {MIN_SERIES_DAYS} days")
+                forecasts = {}
+                for member, forecast, error in forecast_many(series, max(args.months), metric, fingerprint,
+                                                             timeout=args.timeout, engine=args.engine):
+                    if error is None:
+                        forecasts[member] = forecast
+                    else:
+                        step(f"  {dimension}={member}: {error}")
+                if forecasts:
+                    for months in args.months:
+                        # A shorter horizon is the longest forecast cut at its last day
+                        table = pd.concat([
+                            forecast[forecast["ds"] <= series[member]["ds"].max() + pd.Timedelta(days=months * 30)].assign(Series=str(member))
+                            for member, forecast in forecasts.items()
+                        ], ignore_index=True)
+                        name = batch_artifact_name("member_forecasts", dimension=dimension, metric=metric, months=months,
+                                                   settings=DEFAULT_SEASONALITY, engine=args.engine)
+                        save(name, table)
+                        artifacts.append(name)
+                step(f"{metric} forecasts written for {len(forecasts)}/{len(series)} {dimension} members")
+
+        if "Sales" in cube.measures:
+            for granularity in ANOMALY_GRANULARITIES:
+                for dimension in [None] + dimensions:
+                    matrix = anomaly_matrix(dataset.rollup(dimension) if dimension else cube, "Sales", granularity, dimension)
+                    # The Anomalies page only offers "% from average" for the total
+                    for method in [m for m in ANOMALY_METHODS if dimension is None or m != "percent"]:
+                        table = detect_anomalies(matrix, method, MIN_THRESHOLDS[method], granularity)
+                        name = batch_artifact_name("anomalies", granularity=granularity, method=method, dimension=dimension)
+                        save(name, table)
+                        artifacts.append(name)
+            step("Anomaly tables written")
+    else:
+        step("No order date mapped; skipping forecasts and anomalies")
+
+    save("manifest", {
+        "fingerprint": fingerprint,
+        "source": source,
+        "column_map": dataset.column_map,
+        "generated": datetime.datetime.now().isoformat(timespec="seconds"),
+        "artifacts": artifacts,
+    })
+    step(f"Done in {time.perf_counter() - started:.1f}s: {len(artifacts)} artifacts in {batch_artifact_dir(fingerprint, args.cache_dir)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
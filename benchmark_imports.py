@@ -0,0 +1,87 @@
+"""Measure cold import cost of the app modules with `python -X importtime`.
+
+Usage:
+    python benchmark_imports.py                      # helper, top 15 modules
+    python benchmark_imports.py helper --top 25
+    python benchmark_imports.py app --budget-ms 1500 --forbid prophet
+
+Each target is imported in a fresh interpreter so nothing is already cached.
+Exits non-zero when a target exceeds --budget-ms or itself pulls in a
+--forbid module (one its dependencies load anyway is only noted), so it can
+guard against heavy imports creeping back onto startup.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure(target):
+    """Return [(module, self_us, cumulative_us, depth)] for a fresh `import target`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {target} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def importer(rows, name):
+    """The package the target imported that first pulled in package `name`, or None if it never loaded."""
+    for i, (module, _, _, depth) in enumerate(rows):
+        if module.split(".")[0] == name:
+            # -X importtime lists a module before the import that triggered it, so its depth-1 ancestor follows
+            return next((m.split(".")[0] for m, _, _, d in rows[i:] if d <= 1), name)
+    return None
+
+
+def report(target, rows, top):
+    total_us = next((cumulative for module, _, cumulative, _ in rows if module == target), 0)
+    print(f"\n{target}: {total_us / 1000:.0f} ms, {len(rows)} modules")
+    # Top-level packages (depth 1) are what a lazy import would actually save
+    packages = sorted((r for r in rows if r[3] == 1), key=lambda r: r[2], reverse=True)
+    print(f"  {'module':<40}{'cumulative ms':>15}{'self ms':>10}")
+    for module, self_us, cumulative_us, _ in packages[:top]:
+        print(f"  {module:<40}{cumulative_us / 1000:>15.1f}{self_us / 1000:>10.1f}")
+    return total_us / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("targets", nargs="*", default=["helper"], help="modules to import (default: helper)")
+    parser.add_argument("--top", type=int, default=15, help="number of packages to list")
+    parser.add_argument("--budget-ms", type=float, help="fail if a target takes longer than this")
+    parser.add_argument("--forbid", nargs="*", default=[], help="packages that must not be imported at startup")
+    args = parser.parse_args()
+
+    failures = []
+    for target in args.targets:
+        rows = measure(target)
+        total_ms = report(target, rows, args.top)
+        if args.budget_ms is not None and total_ms > args.budget_ms:
+            failures.append(f"{target} took {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+        for name in args.forbid:
+            # A package a dependency loads anyway (pandas brings pytz) isn't the target's to defer
+            via = importer(rows, name)
+            if via is not None and (via == name or os.path.exists(f"{via}.py")):
+                failures.append(f"{target} imports {name} at startup")
+            elif via is not None:
+                print(f"  note: {name} is imported by {via}, not by {target}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
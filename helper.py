@@ -1,12 +1,46 @@
 import pandas as pd
+import numpy as np
 import streamlit as st
 import datetime
+import copy
 import glob, os
-import requests
-import pytz  # Re-added pytz for timezone handling
-import pickle
-from typing import Optional, Dict
-import difflib
+import io
+import itertools
+import sys
+import time
+import threading
+import uuid
+import weakref
+import importlib.util
+import hashlib
+import json
+import pytz  # pandas already imports it, so deferring it saves nothing
+import re
+import tempfile
+import warnings
+
+
+def lazy_import(name):
+    """Return module `name`, deferring its actual import until first attribute access."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# Only a handful of pages need requests, so keep it off the cold-start path
+requests = lazy_import("requests")
+
+# pandas 3 always copies on write; opt in on 2.x so views of the shared dataset stay safe to hand out
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
 
 excel_type =["vnd.ms-excel","vnd.openxmlformats-officedocument.spreadsheetml.sheet", "vnd.oasis.opendocument.spreadsheet", "vnd.oasis.opendocument.text"]
 
@@ -20,9 +54,11 @@ def match_elements(list_a, list_b):
 def download_data(data, label):
     current_time = datetime.datetime.now(pytz.timezone('Asia/Kolkata'))
     current_time = "{}.{}-{}-{}".format(current_time.date(), current_time.hour, current_time.minute, current_time.second)
+    # Hashing and serializing wait until the button is actually clicked
+    version = lambda: hashlib.blake2b(pd.util.hash_pandas_object(data).to_numpy().tobytes(), digest_size=16).hexdigest()
     export_data = st.download_button(
                         label="Download {} data as CSV".format(label),
-                        data=data.to_csv(),
+                        data=lazy_export(data, version, index=True),
                         file_name='{}{}.csv'.format(label, current_time),
                         mime='text/csv',
                         help = "When You Click On Download Button You can download your {} CSV File".format(label)
@@ -56,27 +92,273 @@ def handling_missing_values(data, option_type, dict_value=None):
     
     return data
 
+# Automatically clean and preprocess data
+def clean_data(df):
+    """Handle missing values and correct common data issues."""
+    # One pass over the dtypes instead of a select_dtypes scan per kind
+    fills = {}
+    for col, dtype in df.dtypes.items():
+        if dtype == object or pd.api.types.is_string_dtype(dtype):
+            fills[col] = 'Unknown'  # Fill missing strings with 'Unknown'
+        elif pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+            fills[col] = 0  # Fill missing numbers with 0
+    return df.fillna(fills) if fills else df
+
+def plan_downcast(chunk, category_ratio=0.5):
+    """Decide from the first chunk which columns become categories and which floats may shrink to float32."""
+    plan = {}
+    for col in chunk.columns:
+        series = chunk[col]
+        if series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+            if len(series) and series.nunique() / len(series) <= category_ratio:
+                plan[col] = "category"
+        elif pd.api.types.is_float_dtype(series.dtype):
+            plan[col] = "float32"
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            plan[col] = "integer"
+    return plan
+
+def downcast_chunk(chunk, plan):
+    """Apply a downcast plan; floats only shrink when float32 keeps them within 1e-6 relative error."""
+    for col, kind in plan.items():
+        if col not in chunk.columns:
+            continue
+        if kind == "category":
+            chunk[col] = chunk[col].astype("category")
+        elif kind == "float32":
+            values = chunk[col].to_numpy(dtype="float64")
+            shrunk = values.astype("float32")
+            if np.allclose(shrunk, values, rtol=1e-6, atol=0, equal_nan=True):
+                chunk[col] = shrunk
+        elif kind == "integer":
+            chunk[col] = pd.to_numeric(chunk[col], downcast="integer")
+    return chunk
+
+def concat_chunks(chunks):
+    """Concatenate cleaned chunks, merging per-chunk categories instead of falling back to object."""
+    if len(chunks) == 1:
+        return chunks[0]
+    categorical = [
+        col for col in chunks[0].columns
+        if all(isinstance(chunk[col].dtype, pd.CategoricalDtype) for chunk in chunks)
+    ]
+    merged = {}
+    for col in categorical:
+        try:
+            merged[col] = pd.api.types.union_categoricals([chunk[col] for chunk in chunks])
+        except TypeError:
+            pass  # Categories of mixed types; let concat fall back to object
+    data = pd.concat([chunk.drop(columns=list(merged)) for chunk in chunks], ignore_index=True)
+    for col, values in merged.items():
+        data[col] = values
+    return data[chunks[0].columns]
+
+def _csv_chunks(file, chunk_rows):
+    yield from pd.read_csv(file, encoding_errors='ignore', chunksize=chunk_rows)
+
+def _excel_chunks(file, chunk_rows):
+    from openpyxl import load_workbook
+    sheet = load_workbook(file, read_only=True, data_only=True).active
+    rows = sheet.iter_rows(values_only=True)
+    header = [str(name) for name in next(rows)]
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == chunk_rows:
+            yield pd.DataFrame(batch, columns=header).infer_objects()
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=header).infer_objects()
+
+def read_in_chunks(file, file_name, chunk_rows=100_000, memory_budget_mb=1024, progress=None, profiler=None):
+    """Stream a CSV/Excel upload: clean and downcast each chunk, staying under a memory budget.
+
+    `progress` is called with (rows read, fraction of the file consumed, rows/sec)
+    and a ProfileBuilder passed as `profiler` sees every cleaned chunk.
+    Raises MemoryError once the retained chunks (plus the final concatenation)
+    would exceed `memory_budget_mb`.
+    """
+    if file_name.endswith(".csv"):
+        chunk_iter = _csv_chunks(file, chunk_rows)
+    elif file_name.endswith(".xlsx"):
+        chunk_iter = _excel_chunks(file, chunk_rows)
+    else:
+        raise ValueError("Unsupported file type. Please upload a CSV or Excel file.")
+
+    budget = memory_budget_mb * 1024 ** 2
+    total_size = getattr(file, "size", None)
+    chunks, plan, retained, rows = [], None, 0, 0
+    started = time.perf_counter()
+    for chunk in chunk_iter:
+        chunk = clean_data(chunk)
+        if plan is None:
+            plan = plan_downcast(chunk)
+        chunk = downcast_chunk(chunk, plan)
+        retained += chunk.memory_usage(deep=True).sum()
+        # The final concat briefly holds a second copy of everything retained
+        if 2 * retained > budget:
+            raise MemoryError(
+                f"The file needs more than the {memory_budget_mb} MB memory budget after {rows:,} rows. "
+                "Raise the budget or upload a smaller extract."
+            )
+        chunks.append(chunk)
+        rows += len(chunk)
+        if profiler is not None:
+            profiler.update(chunk)
+        if progress is not None:
+            fraction = min(file.tell() / total_size, 1.0) if total_size and hasattr(file, "tell") else None
+            progress(rows, fraction, rows / max(time.perf_counter() - started, 1e-9))
+
+    if not chunks:
+        return pd.DataFrame()
+    return concat_chunks(chunks)
+
+def _leading_zeros(values):
+    """Leading zero bits of each uint64, via exact float log2 of the two 32-bit halves."""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    with np.errstate(divide="ignore"):
+        high_zeros = 31 - np.floor(np.log2(high))
+        low_zeros = 63 - np.floor(np.log2(low))
+    return np.where(high > 0, high_zeros, np.where(low > 0, low_zeros, 64)).astype(np.int64)
+
+class HyperLogLog:
+    """Approximate distinct count in 2**p one-byte registers (about 1.6% error at p=12)."""
+
+    def __init__(self, p=12):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def update(self, values):
+        """Add the non-null values of a Series."""
+        values = values.dropna()
+        if not len(values):
+            return
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        buckets = (hashes >> np.uint64(64 - self.p)).astype(np.intp)
+        ranks = np.minimum(_leading_zeros(hashes << np.uint64(self.p)) + 1, 64 - self.p + 1)
+        np.maximum.at(self.registers, buckets, ranks.astype(np.uint8))
+
+    def count(self):
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.exp2(-self.registers.astype(float)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)  # Linear counting is more accurate for small cardinalities
+        return int(round(estimate))
+
+class DataProfile:
+    """Schema summary of a frame: exact or estimated counts plus a row sample for kinds and quantiles."""
+
+    def __init__(self, rows, sample, nulls, distinct, estimated):
+        self.rows = rows
+        self.sample = sample
+        self.nulls = nulls
+        self.distinct = distinct
+        self.estimated = estimated
+
+    def summary(self):
+        """One row per column: type, inferred kind, null share, distinct count and sample quantiles."""
+        records = []
+        for col in self.sample.columns:
+            values = self.sample[col]
+            kind = sniff_kind(values)
+            low = median = high = ""
+            present = values.dropna()
+            if len(present) and pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+                low, median, high = (f"{q:,.2f}" for q in np.quantile(present.to_numpy(dtype=float), [0, 0.5, 1]))
+            elif len(present) and pd.api.types.is_datetime64_any_dtype(values.dtype):
+                low, median, high = (f"{q:%Y-%m-%d}" for q in present.quantile([0, 0.5, 1]))
+            records.append({
+                "Column": col,
+                "Type": str(values.dtype),
+                "Kind": kind,
+                "Nulls (%)": round(100 * self.nulls.get(col, 0) / self.rows, 2) if self.rows else 0.0,
+                "Distinct": int(self.distinct.get(col, 0)),
+                "Min": low,
+                "Median": median,
+                "Max": high,
+            })
+        return pd.DataFrame(records)
+
+class ProfileBuilder:
+    """One-pass profile over a stream of chunks.
+
+    Row and null counts are exact, distinct counts come from a HyperLogLog
+    sketch per column, and a reservoir sample (Algorithm R, vectorized per
+    chunk) of `sample_size` rows backs kinds and quantiles.
+    """
+
+    def __init__(self, sample_size=10_000, seed=0):
+        self.sample_size = sample_size
+        self.rows = 0
+        self.nulls = None
+        self.sketches = {}
+        self._sample = None
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, chunk):
+        nulls = chunk.isna().sum()
+        self.nulls = nulls if self.nulls is None else self.nulls.add(nulls, fill_value=0)
+        for col in chunk.columns:
+            self.sketches.setdefault(col, HyperLogLog()).update(chunk[col])
+        # Row t (counting from 0) takes slot t while filling, then a random slot in [0, t] if that is < sample_size
+        seen = self.rows + np.arange(len(chunk))
+        slots = np.where(seen < self.sample_size, seen, self._rng.integers(0, seen + 1))
+        keep = slots < self.sample_size
+        incoming = chunk.iloc[np.flatnonzero(keep)].set_axis(slots[keep])
+        sample = incoming if self._sample is None else pd.concat([self._sample, incoming])
+        # A later row landing in the same slot replaces the earlier one, as in the sequential algorithm
+        self._sample = sample[~sample.index.duplicated(keep="last")]
+        self.rows += len(chunk)
+
+    def result(self):
+        distinct = pd.Series({col: sketch.count() for col, sketch in self.sketches.items()}, dtype="int64")
+        sample = self._sample.sort_index() if self._sample is not None else pd.DataFrame()
+        return DataProfile(self.rows, sample, self.nulls if self.nulls is not None else pd.Series(dtype="int64"), distinct, estimated=True)
+
+def profile_frame(data, sample_size=10_000, seed=0):
+    """Profile an in-memory frame from a uniform sample of `sample_size` rows, in time independent of its length.
+
+    Null counts are scaled up from the sample and distinct counts use the GEE
+    estimator (sqrt(N/n) * singletons + repeated values), except that a column
+    with no repeats in the sample is taken to be unique. Small frames are
+    profiled exactly.
+    """
+    rows = len(data)
+    if rows <= sample_size:
+        return DataProfile(rows, data, data.isna().sum(), data.nunique(), estimated=False)
+    positions = np.sort(np.random.default_rng(seed).choice(rows, sample_size, replace=False))
+    sample = data.iloc[positions]
+    scale = rows / sample_size
+    distinct = {}
+    for col in sample.columns:
+        counts = sample[col].value_counts()
+        singletons = int((counts == 1).sum())
+        if singletons == counts.sum():
+            distinct[col] = rows - int(sample[col].isna().sum() * scale)
+            continue
+        distinct[col] = min(rows, round(np.sqrt(scale) * singletons + len(counts) - singletons))
+    return DataProfile(rows, sample, sample.isna().sum() * scale, pd.Series(distinct), estimated=True)
+
+def exact_column_stats(series):
+    """Full-scan statistics for one column, for when the sampled profile isn't enough."""
+    stats = {"Rows": len(series), "Nulls": int(series.isna().sum()), "Distinct": int(series.nunique())}
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        stats.update(series.describe().drop("count").to_dict())
+    elif pd.api.types.is_datetime64_any_dtype(series.dtype):
+        stats.update({"Min": series.min(), "Max": series.max()})
+    else:
+        top = series.value_counts().head(1)
+        if len(top):
+            stats.update({"Most common": top.index[0], "Occurrences": int(top.iloc[0])})
+    return stats
+
 def clear_image_cache():
     removing_files = glob.glob('temp/*.png')
     for i in removing_files:
         os.remove(i)
 
-# Function to fetch exchange rates from a free API
-@st.cache_data(ttl=3600)  # Cache for 1 hour
-def fetch_exchange_rate(base_currency: str = "USD", target_currency: str = "USD") -> float:
-    """Fetch exchange rates from a free API."""
-    try:
-        response = requests.get(f"https://api.exchangerate-api.com/v4/latest/{base_currency}")
-        if response.status_code == 200:
-            rates = response.json().get("rates", {})
-            return rates.get(target_currency, 1.0)  # Default to 1.0 if target currency not found
-        else:
-            st.warning("Failed to fetch exchange rates. Using default rate of 1.0.")
-            return 1.0
-    except Exception as e:
-        st.error(f"Error fetching exchange rate: {e}")
-        return 1.0
-
 def show_sidebar_guide():
     st.sidebar.title("🧭 Navigation Guide")
     st.sidebar.markdown("- **Upload**: Add your dataset.")
@@ -90,48 +372,1791 @@ def show_sidebar_guide():
     st.sidebar.markdown("🙋 Have suggestions?")
     st.sidebar.markdown("[Send Feedback](https://formspree.io/f/moverold)")
 
-# Store column map in session file
-def save_session_state():
-    with open("session_state.pkl", "wb") as f:
-        pickle.dump(st.session_state.column_map, f)
+# Logical dimensions the pages filter and group by
+DIMENSIONS = ["Category", "Sub-Category", "Region", "Segment", "Product"]
+
+# Dimensions of the shared day-grain cube. Products and sub-categories have so many
+# members that day x product cells are about as many as rows, so they get their own
+# rollups (Dataset.rollup) or are grouped from the selected rows (Selection.totals).
+CUBE_DIMENSIONS = ["Category", "Region", "Segment"]
+
+class RollupCube:
+    """Sum/count/min/max of Sales and Profit per (day, dimension) cell.
+
+    Month and quarter queries aggregate the day cells, so answering a filter or
+    date-range change costs time proportional to the number of cells, not rows.
+    """
+
+    STATS = ["sum", "count", "min", "max"]
+
+    def __init__(self, dataset, cells=None, dimensions=CUBE_DIMENSIONS):
+        self.date_column = dataset.date_column
+        self.dimensions = {name: dataset.dimensions[name] for name in dimensions if name in dataset.dimensions}
+        self.measures = {
+            name: col for name, col in (("Sales", dataset.sales_column), ("Profit", dataset.profit_column))
+            if col in dataset.columns
+        }
+        self.keys = ["Day"] + list(self.dimensions)
+        self.cells = self._aggregate(dataset.frame) if cells is None else self._add_periods(cells)
+        self._converted = {}
+
+    def _aggregate(self, frame):
+        """Group raw rows into day x dimension cells."""
+        if self.date_column in frame.columns:
+            days = pd.to_datetime(frame[self.date_column], errors="coerce").dt.normalize()
+        else:
+            days = pd.Series(pd.NaT, index=frame.index, dtype="datetime64[ns]")
+        parts = {"Day": days}
+        for name, col in self.dimensions.items():
+            parts[name] = frame[col]
+        for name, col in self.measures.items():
+            parts[name] = frame[col]
+        aggregations = {"Orders": ("Day", "size")}
+        for name in self.measures:
+            for stat in self.STATS:
+                aggregations[f"{name}_{stat}"] = (name, stat)
+        cells = (
+            pd.DataFrame(parts)
+            .groupby(self.keys, observed=True, dropna=False, sort=False)
+            .agg(**aggregations)
+            .reset_index()
+        )
+        return self._add_periods(cells)
+
+    @staticmethod
+    def _add_periods(cells):
+        cells["Month"] = cells["Day"].dt.to_period("M")
+        cells["Quarter"] = cells["Day"].dt.to_period("Q")
+        return cells
+
+    def combine(self, cells, keys):
+        """Aggregate `cells` (e.g. from `select`) by `keys`: sums and counts add up, mins and maxes carry over.
+
+        Without keys a Series of totals is returned.
+        """
+        aggregations = {}
+        for col in cells.columns:
+            if col == "Orders" or col.endswith(("_sum", "_count")):
+                aggregations[col] = "sum"
+            elif col.endswith("_min"):
+                aggregations[col] = "min"
+            elif col.endswith("_max"):
+                aggregations[col] = "max"
+        if not keys:
+            return cells.agg(aggregations)
+        return cells.groupby(keys, observed=True, dropna=False).agg(aggregations)
+
+    def query(self, by=(), start=None, end=None, filters=None):
+        """Aggregate the cube by the given keys ("Day", "Month", "Quarter" and/or dimensions).
+
+        `start`/`end` bound the day range (inclusive) and `filters` maps a dimension
+        or period key to the values to keep. Without keys a Series of totals is returned.
+        """
+        return self.combine(self.select(start, end, filters), list(by))
+
+    def select(self, start=None, end=None, filters=None):
+        """The cells within the day range that match `filters`, not yet aggregated."""
+        cells = self.cells
+        mask = pd.Series(True, index=cells.index)
+        if start is not None:
+            mask &= cells["Day"] >= pd.Timestamp(start)
+        if end is not None:
+            mask &= cells["Day"] <= pd.Timestamp(end)
+        for name, values in (filters or {}).items():
+            if values is not None and len(values):
+                mask &= cells[name].isin(values)
+        return cells[mask]
+
+    def members(self, name, start=None, end=None):
+        """Distinct values of a dimension within the day range."""
+        return self.query(by=[name], start=start, end=end).index.tolist()
+
+    def append(self, rows):
+        """Fold newly appended raw rows into the cube, recomputing only the cells they touch."""
+        new_cells = self._aggregate(rows)
+        existing = pd.MultiIndex.from_frame(self.cells[self.keys])
+        touched = existing.isin(pd.MultiIndex.from_frame(new_cells[self.keys]))
+        updated = self.combine(pd.concat([self.cells[touched], new_cells]), self.keys).reset_index()
+        self.cells = pd.concat([self.cells[~touched], self._add_periods(updated)], ignore_index=True)
+        self._converted = {}
+
+    def in_currency(self, currency, rates, source=None):
+        """The cube with its money columns converted, cached per currency and rate `source`.
+
+        `rates` is a spot rate, or a function mapping the cells' days to one rate
+        per cell. Each cell holds a single day, so converting its totals at that
+        day's rate equals converting every order at its order-date rate.
+        """
+        key = (currency, source if callable(rates) else float(rates))
+        if key not in self._converted:
+            converted = copy.copy(self)
+            converted.cells = convert_rollup(self.cells, rates(self.cells["Day"]) if callable(rates) else rates)
+            converted._converted = {}
+            # One conversion per currency is enough; a new rate or history replaces the old one
+            self._converted = {k: v for k, v in self._converted.items() if k[0] != currency}
+            self._converted[key] = converted
+        return self._converted[key]
+
+class Selection:
+    """Rows picked by the filter engine, held as positions and only materialized on request."""
+
+    def __init__(self, dataset, positions):
+        self.dataset = dataset
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def values(self, column, rates=None):
+        """Values of one column at the selected positions, times `rates` (a scalar or one rate per dataset row)."""
+        values = self.dataset.column(column).to_numpy()[self.positions]
+        if rates is None:
+            return values
+        return values * (rates[self.positions] if np.ndim(rates) else rates)
+
+    def totals(self, name, columns, rates=None):
+        """Per-member sums of `columns`, plus an "Orders" count, for dimension `name` over the selected rows."""
+        dimension = self.dataset.column(self.dataset.dimensions[name])
+        codes = dimension.cat.codes.to_numpy()[self.positions]
+        keep = codes >= 0
+        codes, size = codes[keep], len(dimension.cat.categories)
+        counts = np.bincount(codes, minlength=size)
+        present = counts > 0
+        table = pd.DataFrame(
+            {col: np.bincount(codes, weights=np.nan_to_num(self.values(col, rates)[keep]), minlength=size)[present]
+             for col in columns},
+            index=pd.Index(dimension.cat.categories[present], name=name),
+        )
+        table["Orders"] = counts[present]
+        return table
+
+    def frame(self, columns=None):
+        """Materialize the selected rows (optionally only `columns`) as a DataFrame."""
+        frame = self.dataset.frame
+        if columns is not None:
+            frame = frame[list(columns)]  # Project first so only the chosen columns are gathered
+        return frame.iloc[self.positions]
+
+class FilterEngine:
+    """Row index for interactive filtering.
+
+    Dates are kept sorted so a range resolves with two binary searches, and each
+    dimension value gets a packed bitmap (built lazily, then reused) that is
+    OR-ed within a dimension and AND-ed across dimensions.
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.size = len(dataset)
+        self._bitmaps = {}
+        self._date_order = None
+        if dataset.dates is not None:
+            dates = dataset.dates.to_numpy(dtype="datetime64[ns]")
+            self._date_order = np.argsort(dates, kind="stable")  # NaT sorts last
+            self._sorted_dates = dates[self._date_order]
+
+    def bitmap(self, name, value):
+        """Packed bitmap of the rows where dimension `name` equals `value`."""
+        key = (name, value)
+        if key not in self._bitmaps:
+            column = self.dataset.column(self.dataset.dimensions[name])
+            code = column.cat.categories.get_indexer([value])[0]
+            codes = column.cat.codes.to_numpy()
+            self._bitmaps[key] = np.packbits(codes == code if code >= 0 else np.zeros(len(codes), dtype=bool))
+        return self._bitmaps[key]
+
+    def date_positions(self, start=None, end=None):
+        """Row positions with start <= date < end + 1 day, found by binary search."""
+        lo, hi = 0, self.size
+        if start is not None:
+            lo = np.searchsorted(self._sorted_dates, np.datetime64(pd.Timestamp(start), "ns"), side="left")
+        if end is not None:
+            end = np.datetime64(pd.Timestamp(end) + pd.Timedelta(days=1), "ns")
+            hi = np.searchsorted(self._sorted_dates, end, side="left")
+        else:
+            hi = self.size - int(np.isnat(self._sorted_dates).sum())
+        return np.sort(self._date_order[lo:hi])
+
+    def select(self, start=None, end=None, filters=None):
+        """Resolve a date range and dimension filters to a lazy Selection."""
+        positions = None
+        if self._date_order is not None and (start is not None or end is not None):
+            positions = self.date_positions(start, end)
+
+        mask = None
+        for name, values in (filters or {}).items():
+            if not values or name not in self.dataset.dimensions:
+                continue
+            dimension = np.bitwise_or.reduce([self.bitmap(name, value) for value in values])
+            mask = dimension if mask is None else mask & dimension
+
+        if mask is None:
+            if positions is None:
+                positions = np.arange(self.size)
+            return Selection(self.dataset, positions)
+
+        rows = np.unpackbits(mask, count=self.size).astype(bool)
+        if positions is not None:
+            positions = positions[rows[positions]]
+        else:
+            positions = np.flatnonzero(rows)
+        return Selection(self.dataset, positions)
+
+class RowFilter:
+    """Date range and dimension filters as a small, hashable predicate that outlives the page that set it.
+
+    Dates are stored as ISO strings and members as sorted tuples, so `key`
+    is stable and can name cached artifacts built from the filtered rows.
+    """
+
+    def __init__(self, start=None, end=None, filters=None):
+        self.start = pd.Timestamp(start).date().isoformat() if start is not None else None
+        self.end = pd.Timestamp(end).date().isoformat() if end is not None else None
+        self.filters = {name: tuple(sorted(values, key=str)) for name, values in sorted((filters or {}).items()) if values}
+
+    @property
+    def key(self):
+        return json.dumps([self.start, self.end, self.filters], default=str)
+
+    def __bool__(self):
+        return bool(self.start or self.end or self.filters)
+
+    def __eq__(self, other):
+        return isinstance(other, RowFilter) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def describe(self):
+        """Readable summary, e.g. '2016-01-01 to 2016-12-31; Region: East, West'."""
+        parts = []
+        if self.start or self.end:
+            parts.append(f"{self.start or 'start'} to {self.end or 'end'}")
+        parts += [f"{name}: {', '.join(map(str, values))}" for name, values in self.filters.items()]
+        return "; ".join(parts) or "No filters"
+
+    def select(self, dataset):
+        """Rows of `dataset` matching the predicate, resolved through its filter engine."""
+        return dataset.filter_engine.select(start=self.start, end=self.end, filters=self.filters)
+
+class Dataset:
+    """Typed, read-only data built once per upload and shared by every page and session.
+
+    The base frame is never written to. `frame` hands out copy-on-write views,
+    so a caller that adds or overwrites a column only changes its own view, and
+    derived values (profitability tables, extra rollups, ...) come from
+    `derived`, which computes each one once and caches it with the dataset.
+    """
+
+    def __init__(self, frame, column_map, dimensions, source=None):
+        self._frame = frame
+        # The frame as loaded, before typing, so a remap starts from the original columns
+        self.source = frame if source is None else source
+        self.column_map = dict(column_map)
+        self.date_column = column_map.get("Order Date")
+        self.sales_column = column_map.get("Sales")
+        self.profit_column = column_map.get("Profit")
+        self.dimensions = dimensions
+        self._derived = {}
+        self._cube = None
+        self._filter_engine = None
+        self._fingerprint = None
+
+    @property
+    def frame(self):
+        """A view of the data; writes to it never reach the shared base frame."""
+        return self._frame.copy(deep=False)
+
+    @property
+    def columns(self):
+        return self._frame.columns
+
+    def __len__(self):
+        return len(self._frame)
+
+    def column(self, name):
+        """One column of the base frame (copy-on-write, so safe to hand out)."""
+        return self._frame[name]
+
+    def derived(self, name, compute):
+        """Value computed from the dataset by `compute(dataset)`, cached under `name` for the dataset's lifetime."""
+        if name not in self._derived:
+            self._derived[name] = compute(self)
+        return self._derived[name]
+
+    @property
+    def dates(self):
+        if self.date_column not in self._frame.columns:
+            return None
+        return self.column(self.date_column)
+
+    @property
+    def fingerprint(self):
+        """Content hash of the typed frame and column map, used to key derived artifacts."""
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(json.dumps(self.column_map, sort_keys=True).encode())
+            digest.update(",".join(map(str, self._frame.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(self._frame, index=False).to_numpy().tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    @property
+    def cube(self):
+        """Rollup cube of the measures, computed on first use and kept for the dataset's lifetime."""
+        if self._cube is None:
+            # Reuse the cells a batch run precomputed for this exact data, if any
+            cells = read_batch_artifact(self.fingerprint, "rollup") if os.path.isdir(BATCH_CACHE_DIR) else None
+            self._cube = RollupCube(self, cells)
+        return self._cube
+
+    def rollup(self, *dimensions):
+        """A cube holding `dimensions`: the shared cube when it has them, else a day x `dimensions` rollup built on first use."""
+        if all(name in self.cube.dimensions for name in dimensions):
+            return self.cube
+        return self.derived(("rollup",) + dimensions, lambda ds: RollupCube(ds, dimensions=dimensions))
 
-def load_session_state():
+    @property
+    def filter_engine(self):
+        """Date index and dimension bitmaps, built on first use."""
+        if self._filter_engine is None:
+            self._filter_engine = FilterEngine(self)
+        return self._filter_engine
+
+def build_dataset(data, column_map):
+    """Parse dates, cast measures and encode dimensions once so pages never redo it on rerun."""
+    # A shallow copy is enough: with copy-on-write the casts below never touch `data`
+    frame = data.copy(deep=False)
+    date_col = column_map.get("Order Date")
+    measure_cols = [column_map.get("Sales"), column_map.get("Profit")]
+
+    if date_col in frame.columns:
+        column = frame[date_col]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # Streamed uploads keep dates as categories: parse each distinct value once
+            parsed = pd.to_datetime(pd.Series(column.cat.categories), errors="coerce")
+            frame[date_col] = parsed.reindex(column.cat.codes).to_numpy()
+        else:
+            frame[date_col] = pd.to_datetime(column, errors="coerce")
+    for col in measure_cols:
+        if col in frame.columns:
+            frame[col] = pd.to_numeric(frame[col], errors="coerce").astype("float64")
+
+    dimensions = {}
+    for name in DIMENSIONS:
+        col = column_map.get(name) or name
+        if col in frame.columns and col != date_col and col not in measure_cols:
+            frame[col] = frame[col].astype("category")
+            dimensions[name] = col
+
+    return Dataset(frame, column_map, dimensions, source=data)
+
+class DatasetHandle:
+    """A session's reference to a shared dataset; the store forgets the dataset once no handle is left.
+
+    `frame` is the session's own copy-on-write view of the data as loaded,
+    not the typed frame, so mapping a column to another field and back never
+    leaves it coerced.
+    """
+
+    def __init__(self, store, key, dataset):
+        self.key = key
+        self.dataset = dataset
+        self.frame = dataset.source.copy(deep=False)
+        weakref.finalize(self, store.release, key)
+
+class DatasetStore:
+    """Process-wide datasets keyed by content, so sessions loading the same data share one copy.
+
+    Each `acquire` hands out a DatasetHandle and bumps the key's reference
+    count; the count drops when the handle is garbage collected (a session
+    ending or moving on to other data) and the dataset is evicted at zero.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, build):
+        """Handle on the dataset for `key`, calling `build()` only if no session holds it yet.
+
+        Looking up or inserting the entry and counting the reference happen under
+        one lock. The first caller builds outside it, and callers arriving for
+        the same key meanwhile wait on that build's future instead of building again.
+        """
+        from concurrent.futures import Future
+        with self._lock:
+            entry = self._entries.get(key)
+            building = entry is None
+            if building:
+                entry = self._entries[key] = [Future(), 0]
+            entry[1] += 1
+        if building:
+            try:
+                entry[0].set_result(build())
+            except BaseException as error:
+                with self._lock:
+                    # Nobody holds a failed build, so the next acquire retries it
+                    if self._entries.get(key) is entry:
+                        del self._entries[key]
+                entry[0].set_exception(error)
+                raise
+        return DatasetHandle(self, key, entry[0].result())
+
+    def release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._entries[key]
+
+@st.cache_resource
+def get_dataset_store():
+    """Process-wide dataset store shared by every session."""
+    return DatasetStore()
+
+def use_dataset(data_key, column_map, build):
+    """Point the session at the shared dataset for this content and column map, building it on first use.
+
+    `data_key` identifies the underlying data (an upload hash, or the sample);
+    `build` produces the Dataset if no session holds it yet.
+    """
+    key = (data_key, json.dumps(column_map, sort_keys=True, default=str))
+    handle = get_dataset_store().acquire(key, build)
+    st.session_state.dataset_handle = handle
+    st.session_state.data_key = data_key
+    st.session_state.cleaned_data = handle.frame
+    st.session_state.column_map = dict(handle.dataset.column_map)
+    return handle.dataset
+
+def get_dataset():
+    """Return the session's dataset, switching handles only when the data or column map changed."""
+    data = st.session_state.get("cleaned_data")
+    if data is None:
+        return None
+    column_map = st.session_state.get("column_map", {})
+    handle = st.session_state.get("dataset_handle")
+    if handle is not None and handle.frame is data and handle.dataset.column_map == column_map:
+        return handle.dataset
+    # Data without a content key (set directly) stays private to this session
+    data_key = st.session_state.get("data_key") or f"session-{uuid.uuid4().hex}"
+    return use_dataset(data_key, column_map, lambda: build_dataset(data, column_map))
+
+# Columnar formats accepted alongside CSV/Excel
+COLUMNAR_TYPES = ["parquet", "feather", "arrow"]
+
+# Local cache for precompiled data files
+CACHE_DIR = ".cache"
+SAMPLE_CACHE = os.path.join(CACHE_DIR, "superstore.parquet")
+
+def is_columnar(file_name):
+    return file_name.lower().endswith(tuple(f".{ext}" for ext in COLUMNAR_TYPES))
+
+def read_columnar_schema(file, file_name):
+    """Column names of a Parquet or Arrow IPC/Feather file, read from its footer/schema only."""
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+
+    file.seek(0)
+    if file_name.lower().endswith(".parquet"):
+        names = pq.read_schema(file).names
+    else:
+        names = pyarrow.ipc.open_file(file).schema.names
+    file.seek(0)
+    return [name for name in names if not name.startswith("__index_level_")]
+
+def read_columnar(file, file_name, columns=None):
+    """Read a Parquet or Arrow IPC/Feather file, loading only `columns` when given."""
+    import pyarrow.feather as feather
+
+    file.seek(0)
+    if file_name.lower().endswith(".parquet"):
+        return pd.read_parquet(file, columns=columns)
+    return feather.read_table(file, columns=columns, memory_map=False).to_pandas()
+
+def projected_columns(names):
+    """Pick the columns the pages use (order date, measures, dimensions) from a file's schema."""
+    selected = {col for col in suggest_column_map(names).values() if col is not None}
+    # Keep every product-like column so the Product mapping can still be changed afterwards
+    selected.update(name for name in names if "product" in name.lower())
+    return [name for name in names if name in selected]
+
+def read_upload_file(file, file_name, columns=None):
+    """Read and clean a whole CSV, Excel or columnar file (`columns` only applies to columnar files)."""
+    if is_columnar(file_name):
+        return clean_data(read_columnar(file, file_name, columns=columns))
+    if file_name.endswith(".csv"):
+        return clean_data(pd.read_csv(file, encoding_errors='ignore'))
+    if file_name.endswith(".xlsx"):
+        return clean_data(pd.read_excel(file))
+    raise ValueError("Unsupported file type. Please upload a CSV or Excel file.")
+
+# Parsed uploads, keyed by a hash of the uploaded bytes
+UPLOAD_CACHE_DIR = os.path.join(CACHE_DIR, "uploads")
+UPLOAD_CACHE_MB = 2048
+
+def hash_upload(file, block_size=1 << 20):
+    """Content hash of an upload, computed with streaming BLAKE2b."""
+    digest = hashlib.blake2b(digest_size=20)
+    file.seek(0)
+    for block in iter(lambda: file.read(block_size), b""):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+def upload_cache_key(content_hash, **options):
+    """Upload cache key: the content hash plus the read options that change the parsed frame (e.g. `columns`).
+
+    Options left at None are dropped. Streaming is not an option: a streamed
+    and a whole-file read of the same bytes share one entry.
+    """
+    options = {name: value for name, value in options.items() if value is not None}
+    if not options:
+        return content_hash
+    return f"{content_hash}-{hashlib.blake2b(json.dumps(options, sort_keys=True, default=str).encode(), digest_size=8).hexdigest()}"
+
+def _upload_cache_paths(key):
+    return os.path.join(UPLOAD_CACHE_DIR, f"{key}.arrow"), os.path.join(UPLOAD_CACHE_DIR, f"{key}.json")
+
+def load_cached_upload(key):
+    """Cleaned frame and column map of an upload seen before, or None on a cache miss."""
+    data_path, map_path = _upload_cache_paths(key)
     try:
-        with open("session_state.pkl", "rb") as f:
-            st.session_state.column_map = pickle.load(f)
-    except FileNotFoundError:
-        st.session_state.column_map = {}
+        import pyarrow.feather as feather
+
+        table = feather.read_table(data_path, memory_map=True)
+        with open(map_path) as f:
+            column_map = json.load(f)
+        # Touch the entry so eviction drops the least recently used uploads first
+        os.utime(data_path)
+        os.utime(map_path)
+    except (OSError, ImportError, ValueError):
+        return None
+    return table.to_pandas(), column_map
+
+def save_cached_column_map(key, column_map):
+    """Remember the column map chosen for a cached upload."""
+    _, map_path = _upload_cache_paths(key)
+    try:
+        with open(map_path, "w") as f:
+            json.dump(column_map, f)
+    except OSError:
+        pass
+
+def store_cached_upload(key, data, column_map, max_mb=UPLOAD_CACHE_MB):
+    """Persist a cleaned upload as an uncompressed (memory-mappable) Arrow file plus its column map."""
+    data_path, _ = _upload_cache_paths(key)
+    try:
+        import pyarrow.feather as feather
+
+        os.makedirs(UPLOAD_CACHE_DIR, exist_ok=True)
+        partial = f"{data_path}.partial"
+        feather.write_feather(data.reset_index(drop=True), partial, compression="uncompressed")
+        os.replace(partial, data_path)
+    except (OSError, ImportError, ValueError, TypeError):
+        return  # Unserializable columns or no disk space; the upload still works uncached
+    save_cached_column_map(key, column_map)
+    evict_upload_cache(max_mb)
+
+def evict_upload_cache(max_mb=UPLOAD_CACHE_MB):
+    """Drop least recently used uploads until the cache fits in `max_mb`."""
+    entries = []
+    for data_path in glob.glob(os.path.join(UPLOAD_CACHE_DIR, "*.arrow")):
+        key = os.path.basename(data_path)[:-len(".arrow")]
+        paths = [path for path in _upload_cache_paths(key) if os.path.exists(path)]
+        entries.append((os.path.getmtime(data_path), sum(os.path.getsize(path) for path in paths), paths))
+    total = sum(size for _, size, _ in entries)
+    for _, size, paths in sorted(entries):
+        if total <= max_mb * 1024 ** 2:
+            break
+        for path in paths:
+            os.remove(path)
+        total -= size
+
+def _read_sample_cache():
+    """Typed sample frame from the Parquet cache, or None if missing or older than the CSV."""
+    try:
+        if os.path.getmtime(SAMPLE_CACHE) >= os.path.getmtime("superstore.csv"):
+            return pd.read_parquet(SAMPLE_CACHE)
+    except (OSError, ImportError):
+        pass
+    return None
+
+def _write_sample_cache(frame):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        frame.to_parquet(SAMPLE_CACHE, index=False)
+    except (OSError, ImportError):
+        pass  # The cache is an optimization; the CSV stays the source of truth
+
+# What upload_column_map picks for superstore.csv, so the Upload page's mapping step keeps the shared sample Dataset
+SAMPLE_COLUMN_MAP = {
+    "Order Date": "Order Date",
+    "Sales": "Sales",
+    "Profit": "Profit",
+    "Product": "Product Name",
+    "Category": "Category",
+    "Sub-Category": "Sub-Category",
+    "Region": "Region",
+    "Segment": "Segment",
+}
+
+def read_sample_data():
+    """The typed sample frame, from the Parquet cache when fresh, otherwise parsed from superstore.csv and cached."""
+    cached = _read_sample_cache()
+    if cached is not None:
+        return cached
+    # Decode once in memory instead of re-parsing the whole file when UTF-8 fails
+    with open("superstore.csv", "rb") as f:
+        raw = f.read()
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        text = raw.decode("ISO-8859-1")
+    sample_data = pd.read_csv(io.StringIO(text), on_bad_lines='skip')
+    frame = build_dataset(sample_data, SAMPLE_COLUMN_MAP).frame
+    _write_sample_cache(frame)
+    return frame
+
+def sample_data_key():
+    """Content key for the sample data, changing whenever superstore.csv does."""
+    return f"sample-{os.path.getmtime('superstore.csv')}"
+
+@st.cache_resource(max_entries=2)
+def sample_dataset(key):
+    """The typed sample Dataset for one version (`key`) of superstore.csv, built once per process."""
+    return build_dataset(read_sample_data(), SAMPLE_COLUMN_MAP)
+
+TEMPLATE_ROWS = 5
+
+@st.cache_resource(max_entries=2)
+def upload_template(key, rows=TEMPLATE_ROWS):
+    """Header and first `rows` lines of superstore.csv, as bytes for the Upload page's template download."""
+    with open("superstore.csv", "rb") as f:
+        return b"".join(itertools.islice(f, rows + 1))
 
 def load_sample_data():
-    """Load the sample data and set the column map."""
+    """Load the sample data and set the column map; every session shares the same frame."""
     try:
-        sample_data = pd.read_csv("superstore.csv", encoding="utf-8", on_bad_lines='skip')
-        st.session_state.cleaned_data = sample_data.copy()
-        st.session_state.column_map = {
-            "Order Date": "Order Date",
-            "Sales": "Sales",
-            "Profit": "Profit",
-        }
+        key = sample_data_key()
+        # Kept for the life of the process, so the store never rebuilds it when the last session leaves
+        use_dataset(key, SAMPLE_COLUMN_MAP, lambda: sample_dataset(key))
         st.session_state.source = "sample"
-    except UnicodeDecodeError:
-        try:
-            sample_data = pd.read_csv("superstore.csv", encoding="ISO-8859-1")
-            st.session_state.cleaned_data = sample_data.copy()
-            st.session_state.column_map = {
-                "Order Date": "Order Date",
-                "Sales": "Sales",
-                "Profit": "Profit",
-            }
-            st.session_state.source = "sample"
-        except Exception as e:
-            st.error(f"Error loading sample data: {e}. Please ensure the file is properly encoded.")
     except FileNotFoundError:
         st.error("Sample data file not found. Please ensure 'superstore.csv' exists in the project directory.")
+    except UnicodeDecodeError as e:
+        st.error(f"Error loading sample data: {e}. Please ensure the file is properly encoded.")
     except pd.errors.ParserError as e:
         st.error(f"Error parsing sample data: {e}. Please check the file for formatting issues.")
     except Exception as e:
         st.error(f"Unexpected error loading sample data: {e}")
 
+# Fitted forecast models, keyed by dataset fingerprint + metric + seasonality settings
+FORECAST_CACHE_DIR = os.path.join(CACHE_DIR, "forecasts")
+DEFAULT_SEASONALITY = {"seasonality_mode": "additive", "yearly_seasonality": True, "weekly_seasonality": True}
+
+class ForecastStore:
+    """Fitted Prophet models kept in memory and serialized to disk.
+
+    Models are stored under a key of (dataset fingerprint, metric, settings).
+    Each model is also recorded under its lineage (metric, settings, first
+    date) so a series that only gained new days can warm-start from it. At
+    most `size` models stay in memory, least recently used dropped first;
+    the disk copies remain.
+    """
+
+    def __init__(self, directory=FORECAST_CACHE_DIR, size=32):
+        self.directory = directory
+        self.size = size
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _remember(self, key, model):
+        with self._lock:
+            self._models.pop(key, None)
+            self._models[key] = model  # Re-inserted as the most recently used
+            while len(self._models) > self.size:
+                del self._models[next(iter(self._models))]
+
+    @staticmethod
+    def _hash(*parts):
+        return hashlib.blake2b(json.dumps(parts, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+    def key(self, fingerprint, metric, settings):
+        return self._hash(fingerprint, metric, settings)
+
+    def lineage(self, history, metric, settings):
+        return self._hash(metric, settings, history["ds"].min())
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.json")
+
+    def get(self, key):
+        """Fitted model for `key` from memory or disk, or None."""
+        with self._lock:
+            model = self._models.get(key)
+        if model is None:
+            try:
+                from prophet.serialize import model_from_json
+
+                with open(self._path(key)) as f:
+                    model = model_from_json(f.read())
+            except (OSError, ValueError, KeyError):
+                return None
+        self._remember(key, model)
+        return model
+
+    def latest(self, lineage):
+        """Most recent model fitted for this lineage, or None."""
+        try:
+            with open(self._path(f"lineage-{lineage}")) as f:
+                return self.get(json.load(f)["key"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key, model, lineage=None):
+        self._remember(key, model)
+        try:
+            from prophet.serialize import model_to_json
+
+            os.makedirs(self.directory, exist_ok=True)
+            entries = [(key, model_to_json(model))]
+            if lineage is not None:
+                entries.append((f"lineage-{lineage}", json.dumps({"key": key})))
+            for name, payload in entries:
+                partial = f"{self._path(name)}.partial"
+                with open(partial, "w") as f:
+                    f.write(payload)
+                os.replace(partial, self._path(name))
+        except OSError:
+            pass  # Disk persistence is best effort; the in-memory model still serves this process
+
+@st.cache_resource
+def get_forecast_store():
+    """Process-wide forecast store shared by every session."""
+    return ForecastStore()
+
+def _warm_start_params(model, history):
+    """Prophet init values from a previous fit, if `history` only extends that model's series."""
+    previous = model.history[["ds", "y"]]
+    if len(history) < len(previous) or model.mcmc_samples:
+        return None
+    overlap = history.iloc[:len(previous)]
+    if not (overlap["ds"].to_numpy() == previous["ds"].to_numpy()).all():
+        return None
+    if not np.allclose(overlap["y"].to_numpy(dtype=float), previous["y"].to_numpy(dtype=float)):
+        return None
+    params = {name: model.params[name][0][0] for name in ["k", "m", "sigma_obs"]}
+    params.update({name: model.params[name][0] for name in ["delta", "beta"]})
+    return params
+
+def fit_prophet(history, settings, warm_start=None):
+    """Fit Prophet on a ds/y frame, starting from a previous model's parameters when it applies."""
+    from prophet import Prophet
+
+    init = _warm_start_params(warm_start, history) if warm_start is not None else None
+    if init is not None:
+        try:
+            return Prophet(**settings).fit(history, init=init)
+        except Exception:
+            pass  # Shapes changed (e.g. fewer changepoints); fall back to a cold fit
+    return Prophet(**settings).fit(history)
+
+# 80% interval, the same width Prophet reports by default
+INTERVAL_Z = 1.2816
+
+def _daily_history(history):
+    """Continuous daily dates and values of a ds/y series (days without orders count as zero)."""
+    y = history.groupby("ds")["y"].sum().astype(float)
+    index = pd.date_range(y.index.min(), y.index.max(), freq="D")
+    return index, y.reindex(index, fill_value=0.0).to_numpy()
+
+def _forecast_frame(index, periods, yhat, sigma):
+    """Prophet-shaped output: fitted values over the history, forecast beyond it, +/- INTERVAL_Z sigma bands."""
+    ds = index.append(pd.date_range(index[-1] + pd.Timedelta(days=1), periods=periods, freq="D"))
+    return pd.DataFrame({
+        "ds": ds,
+        "yhat": yhat,
+        "yhat_lower": yhat - INTERVAL_Z * sigma,
+        "yhat_upper": yhat + INTERVAL_Z * sigma,
+    })
+
+def seasonal_naive_forecast(history, periods, settings):
+    """Repeat the last week (or the last day, without weekly seasonality)."""
+    index, y = _daily_history(history)
+    season = min(7 if settings.get("weekly_seasonality", True) else 1, len(y))
+    fitted = np.concatenate([y[:season], y[:-season]])
+    sigma = np.std(y[season:] - y[:-season]) if len(y) > season else 0.0
+
+    steps = np.arange(periods)
+    future = y[-season:][steps % season]
+    seasons_ahead = steps // season + 1
+    sigmas = np.concatenate([np.full(len(y), sigma), sigma * np.sqrt(seasons_ahead)])
+    return _forecast_frame(index, periods, np.concatenate([fitted, future]), sigmas)
+
+def holt_winters_forecast(history, periods, settings, alpha=0.1, beta=0.01, gamma=0.05, phi=0.98):
+    """Additive Holt-Winters exponential smoothing with a damped trend and a weekly season.
+
+    The smoothing recursion is a single O(n) pass over the daily values; the
+    horizon is then projected in one vectorized step. Damping (`phi`) keeps a
+    late spike or dip from being extrapolated indefinitely.
+    """
+    index, y = _daily_history(history)
+    n = len(y)
+    m = 7 if settings.get("weekly_seasonality", True) and n >= 14 else 1
+    level = y[:m].mean()
+    trend = (y[m:2 * m].mean() - level) / m if n >= 2 * m else 0.0
+    season = y[:m] - level if m > 1 else np.zeros(1)
+
+    fitted = np.empty(n)
+    for t in range(n):
+        s = season[t % m]
+        fitted[t] = level + phi * trend + s
+        previous_level = level
+        level = alpha * (y[t] - s) + (1 - alpha) * (level + phi * trend)
+        trend = beta * (level - previous_level) + (1 - beta) * phi * trend
+        season[t % m] = gamma * (y[t] - level) + (1 - gamma) * s
+
+    h = np.arange(1, periods + 1)
+    damped_steps = phi * (1 - phi ** h) / (1 - phi)
+    future = level + damped_steps * trend + season[(n + h - 1) % m]
+    sigma = np.std(y - fitted)
+    sigmas = np.concatenate([np.full(n, sigma), sigma * np.sqrt(1 + (h - 1) * alpha ** 2)])
+    return _forecast_frame(index, periods, np.concatenate([fitted, future]), sigmas)
+
+def linear_seasonal_forecast(history, periods, settings):
+    """Linear trend plus day-of-week and month effects, fitted by least squares.
+
+    With multiplicative seasonality (and a strictly positive series) the fit is
+    done on log values, so seasonal effects scale with the trend.
+    """
+    index, y = _daily_history(history)
+    n = len(y)
+    ds = index.append(pd.date_range(index[-1] + pd.Timedelta(days=1), periods=periods, freq="D"))
+
+    columns = [np.ones(len(ds)), np.arange(len(ds)) / max(n, 1)]
+    if settings.get("weekly_seasonality", True):
+        columns.append((ds.dayofweek.to_numpy()[:, None] == np.arange(1, 7)).astype(float))
+    if settings.get("yearly_seasonality", True):
+        columns.append((ds.month.to_numpy()[:, None] == np.arange(2, 13)).astype(float))
+    design = np.column_stack(columns)
+
+    use_log = settings.get("seasonality_mode") == "multiplicative" and (y > 0).all()
+    target = np.log(y) if use_log else y
+    coef, *_ = np.linalg.lstsq(design[:n], target, rcond=None)
+    fit = design @ coef
+    sigma = np.std(target - fit[:n])
+
+    if use_log:
+        return pd.DataFrame({
+            "ds": ds,
+            "yhat": np.exp(fit),
+            "yhat_lower": np.exp(fit - INTERVAL_Z * sigma),
+            "yhat_upper": np.exp(fit + INTERVAL_Z * sigma),
+        })
+    return _forecast_frame(index, periods, fit, np.full(len(ds), sigma))
+
+# Fast engines take (history, periods, settings) and return ds/yhat/yhat_lower/yhat_upper
+# over the history and the horizon, like Prophet's predict. Register new engines here.
+FAST_FORECAST_ENGINES = {
+    "seasonal_naive": seasonal_naive_forecast,
+    "holt_winters": holt_winters_forecast,
+    "linear_seasonal": linear_seasonal_forecast,
+}
+
+def compute_forecast(history, months, metric, fingerprint, settings=None, store=None, engine="prophet"):
+    """Forecast a ds/y series `months` ahead with Prophet or one of FAST_FORECAST_ENGINES.
+
+    Prophet models are only fitted when no model exists for this dataset, metric
+    and settings; changing the horizon just predicts on a longer future frame.
+    """
+    settings = settings or DEFAULT_SEASONALITY
+    history = history.sort_values("ds").reset_index(drop=True)
+    if engine != "prophet":
+        return FAST_FORECAST_ENGINES[engine](history, months * 30, settings)
+
+    store = store or get_forecast_store()
+
+    key = store.key(fingerprint, metric, settings)
+    model = store.get(key)
+    if model is None:
+        lineage = store.lineage(history, metric, settings)
+        model = fit_prophet(history, settings, warm_start=store.latest(lineage))
+        store.put(key, model, lineage)
+
+    future = model.make_future_dataframe(periods=months * 30)
+    return model.predict(future)
+
+# Members with orders on fewer days than this aren't forecast; a handful of spikes fits no trend
+MIN_SERIES_DAYS = 10
+
+def split_series(cube, dimension, metric, top=None, min_days=MIN_SERIES_DAYS):
+    """Daily ds/y series for the largest `top` members of a dimension, plus the members skipped as too sparse.
+
+    Every series spans the cube's full date range with days without orders
+    as zero, like the total's history. Returns (series, skipped), where
+    `skipped` maps a member to its number of days with orders.
+    """
+    daily = cube.query(by=["Day", dimension])[f"{metric}_sum"]
+    days = daily.index.get_level_values("Day")
+    index = pd.date_range(days.min(), days.max(), freq="D", name="ds")
+    totals = daily.groupby(level=dimension, observed=True).sum().sort_values(ascending=False)
+    members = totals.index[:top] if top else totals.index
+    series, skipped = {}, {}
+    for member in members:
+        values = daily.xs(member, level=dimension).groupby(level="Day").sum().reindex(index, fill_value=0.0)
+        active = int((values != 0).sum())
+        if active < min_days:
+            skipped[member] = active
+            continue
+        series[member] = pd.DataFrame({"ds": index, "y": values.to_numpy(dtype=float)})
+    return series, skipped
+
+def _forecast_series(history, months, metric, fingerprint, settings, directory, engine):
+    """Worker entry point: fit (or load) one series' model and return the slim forecast frame."""
+    forecast = compute_forecast(history, months, metric, fingerprint, settings, store=ForecastStore(directory), engine=engine)
+    return forecast[["ds", "yhat", "yhat_lower", "yhat_upper"]]
+
+# Run by each forecast worker: keep the real stdout for replies and send stray prints to stderr before anything is imported
+FORECAST_WORKER_COMMAND = (
+    "import os, sys; replies = os.fdopen(os.dup(1), 'wb'); os.dup2(2, 1); sys.path.insert(0, {path!r}); "
+    "import helper; helper._forecast_worker(sys.stdin.buffer, replies)"
+)
+
+def _forecast_worker(tasks, replies):
+    """Worker process loop: forecast each pickled (name, args) read from `tasks` until it closes.
+
+    Before fitting, the worker sends ("start", name, time.time()) so the parent
+    times the fit itself rather than the wait for a free worker; it then sends
+    ("done", name, forecast, error).
+    """
+    import pickle
+
+    def send(message):
+        try:
+            data = pickle.dumps(message)
+        except Exception:
+            # Some exceptions can't be pickled; their message still can
+            data = pickle.dumps(message[:-1] + (RuntimeError(str(message[-1])),))
+        replies.write(data)
+        replies.flush()
+
+    while True:
+        try:
+            name, args = pickle.load(tasks)
+        except EOFError:
+            return
+        send(("start", name, time.time()))
+        try:
+            send(("done", name, _forecast_series(*args), None))
+        except Exception as e:
+            send(("done", name, None, e))
+
+class _ForecastWorker:
+    """A forecast worker process fed one series at a time; a reader thread queues its replies."""
+
+    def __init__(self, replies):
+        import subprocess
+
+        # A fresh interpreter rather than a fork (server threads can deadlock a forked child) or a
+        # multiprocessing spawn (which re-runs __main__, the page script under Streamlit)
+        command = FORECAST_WORKER_COMMAND.format(path=os.path.dirname(os.path.abspath(__file__)))
+        self.process = subprocess.Popen([sys.executable, "-c", command], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.name = None
+        self.started = None
+        threading.Thread(target=self._read, args=(replies,), daemon=True).start()
+
+    def _read(self, replies):
+        import pickle
+
+        try:
+            while True:
+                replies.put((self, pickle.load(self.process.stdout)))
+        except Exception:
+            replies.put((self, None))
+
+    def send(self, name, args):
+        import pickle
+
+        self.name, self.started = name, None
+        pickle.dump((name, args), self.process.stdin)
+        self.process.stdin.flush()
+
+    def stop(self):
+        """End the process: an idle worker exits once its input closes, a busy one is killed."""
+        if self.name is not None:
+            self.process.kill()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+
+def forecast_many(series, months, metric, fingerprint, settings=None, timeout=120, max_workers=None, engine="prophet"):
+    """Forecast many series on worker processes, yielding (name, forecast, error) as each finishes.
+
+    Fitted models land in the forecast cache, so a rerun only predicts. A
+    series that raises, crashes its worker or fits for longer than `timeout`
+    seconds is reported with its error and does not affect the others; a
+    worker past the timeout is killed and replaced. Workers still busy when
+    the caller stops iterating are killed too.
+    """
+    import queue
+
+    settings = settings or DEFAULT_SEASONALITY
+    todo = list(series.items())[::-1]
+    replies = queue.Queue()
+    workers = []
+
+    def dispatch(worker):
+        """Give `worker` the next series, or leave it idle when none are left."""
+        worker.name = None
+        if todo:
+            name, history = todo.pop()
+            worker.send(name, (history, months, metric, f"{fingerprint}:{name}", settings, FORECAST_CACHE_DIR, engine))
+
+    def replace(worker):
+        workers.remove(worker)
+        worker.stop()
+        if todo:
+            workers.append(_ForecastWorker(replies))
+            dispatch(workers[-1])
+
+    try:
+        for _ in range(min(max_workers or os.cpu_count() or 1, len(todo))):
+            workers.append(_ForecastWorker(replies))
+            dispatch(workers[-1])
+        while any(worker.name is not None for worker in workers):
+            try:
+                worker, message = replies.get(timeout=0.5)
+            except queue.Empty:
+                worker, message = None, None
+            # Replies from a worker already replaced are stale
+            if worker in workers:
+                if message is None:
+                    name = worker.name
+                    worker.name = None
+                    replace(worker)
+                    if name is not None:
+                        yield name, None, RuntimeError("Forecast worker exited unexpectedly.")
+                elif message[0] == "start":
+                    worker.started = message[2]
+                else:
+                    _, name, forecast, error = message
+                    dispatch(worker)
+                    yield name, forecast, error
+            for worker in list(workers):
+                if worker.started is not None and worker.name is not None and time.time() - worker.started > timeout:
+                    name = worker.name
+                    replace(worker)
+                    yield name, None, TimeoutError(f"Forecast took longer than {timeout} seconds.")
+    finally:
+        for worker in workers:
+            worker.stop()
+
+class Job:
+    """A background computation; streaming jobs also collect the items produced so far in `partial`."""
+
+    def __init__(self):
+        self.future = None
+        self.partial = []
+
+    def done(self):
+        return self.future.done()
+
+    def failed(self):
+        return self.future.done() and (self.future.cancelled() or self.future.exception() is not None)
+
+    def wait(self, timeout=None):
+        """Block up to `timeout` seconds; True once the job has finished."""
+        from concurrent.futures import wait
+
+        wait([self.future], timeout=timeout)
+        return self.future.done()
+
+    def result(self):
+        return self.future.result()
+
+class BackgroundExecutor:
+    """Thread pool shared by every session, so heavy page work survives reruns.
+
+    Jobs are keyed by (dataset fingerprint, operation, params): asking for a key
+    that is already running or finished returns that job instead of starting
+    another. Finished jobs are kept (the `keep` most recent) so a rerun picks up
+    the result; failed ones are dropped so the next request retries.
+    """
+
+    def __init__(self, max_workers=None, keep=128):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or min(4, os.cpu_count() or 1), thread_name_prefix="dashboard-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.keep = keep
+
+    @staticmethod
+    def key(fingerprint, operation, params):
+        return fingerprint, operation, json.dumps(params, sort_keys=True, default=str)
+
+    def get(self, key):
+        """The job for `key`, or None if it was never submitted or has been evicted."""
+        with self._lock:
+            return self._jobs.get(key)
+
+    def submit(self, key, fn, *args, stream=False, **kwargs):
+        """Start `fn(*args, **kwargs)` for `key` unless an equivalent job exists, and return the job.
+
+        With `stream=True`, `fn` is a generator function whose items are appended
+        to `job.partial` as they arrive; the job's result is the full list.
+        """
+        with self._lock:
+            job = self._jobs.pop(key, None)
+            if job is None or job.failed():
+                job = Job()
+                if stream:
+                    job.future = self._pool.submit(self._drain, job.partial, fn, args, kwargs)
+                else:
+                    job.future = self._pool.submit(fn, *args, **kwargs)
+            self._jobs[key] = job  # Re-inserted as the most recently used
+            finished = [k for k, j in self._jobs.items() if j.done()]
+            for stale in finished[:max(0, len(self._jobs) - self.keep)]:
+                del self._jobs[stale]
+            return job
+
+    def discard(self, key):
+        """Forget the job for `key`, so the next submit starts it afresh."""
+        with self._lock:
+            self._jobs.pop(key, None)
+
+    @staticmethod
+    def _drain(partial, fn, args, kwargs):
+        for item in fn(*args, **kwargs):
+            partial.append(item)
+        return partial
+
+@st.cache_resource
+def get_executor():
+    """Process-wide background executor shared by every session."""
+    return BackgroundExecutor()
+
+# Resample rule, trailing window and seasonal period per granularity
+ANOMALY_GRANULARITIES = {
+    "D": {"rule": "D", "window": 28, "period": 7},
+    "W": {"rule": "W", "window": 8, "period": 52},
+    "M": {"rule": "MS", "window": 6, "period": 12},
+}
+MAD_SCALE = 1.4826  # makes the MAD a consistent estimator of the standard deviation
+
+def anomaly_matrix(cube, metric="Sales", granularity="M", dimension=None, top=None):
+    """Wide period x series matrix of a metric's totals, zero-filled where a series had no orders.
+
+    Without a dimension the single column is "Total"; otherwise there is one
+    column per member, largest totals first.
+    """
+    keys = ["Day", dimension] if dimension else ["Day"]
+    totals = cube.query(by=keys)[f"{metric}_sum"]
+    if dimension:
+        frame = totals.unstack(dimension, fill_value=0.0)
+        frame.columns = frame.columns.astype(str)
+    else:
+        frame = totals.to_frame("Total")
+    frame = frame.resample(ANOMALY_GRANULARITIES[granularity]["rule"]).sum()
+    frame.index.name = "Period"
+    order = frame.sum().sort_values(ascending=False).index
+    return frame[order[:top] if top else order].astype(float)
+
+def _spread_floor(values):
+    """Lower bound on the spread so flat stretches of sparse series don't turn every sale into an outlier."""
+    return 0.1 * values.std(axis=0)
+
+def _zscores(values, expected, spread):
+    spread = np.maximum(spread, _spread_floor(values))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = (values - expected) / spread
+    scores[~np.isfinite(scores)] = np.nan
+    return scores
+
+def rolling_mad_scores(values, window):
+    """Robust z-scores against the median and MAD of the preceding `window` points.
+
+    The first `window` rows have no full history and are left unscored.
+    """
+    periods, count = values.shape
+    expected = np.full_like(values, np.nan)
+    spread = np.full_like(values, np.nan)
+    if periods > window:
+        # Work through the columns in blocks to bound the (periods, block, window) temporary
+        block = max(1, 4_000_000 // (periods * window))
+        for lo in range(0, count, block):
+            windows = np.lib.stride_tricks.sliding_window_view(values[:-1, lo:lo + block], window, axis=0)
+            median = np.median(windows, axis=-1)
+            expected[window:, lo:lo + block] = median
+            spread[window:, lo:lo + block] = MAD_SCALE * np.median(np.abs(windows - median[..., None]), axis=-1)
+    return _zscores(values, expected, spread), expected
+
+def ewma_scores(values, window):
+    """Z-scores against an exponentially weighted mean and standard deviation (span `window`) of the prior points."""
+    weighted = pd.DataFrame(values).ewm(span=window, min_periods=max(3, window // 2))
+    expected = weighted.mean().shift(1).to_numpy()
+    spread = weighted.std().shift(1).to_numpy()
+    return _zscores(values, expected, spread), expected
+
+def seasonal_residual_scores(values, window):
+    """Robust z-scores of the residual left after removing a centred trend and a per-phase seasonal profile.
+
+    `window` is the seasonal period; series shorter than two full periods are left unscored.
+    """
+    periods, count = values.shape
+    if periods < 2 * window:
+        return np.full_like(values, np.nan), np.full_like(values, np.nan)
+    trend = pd.DataFrame(values).rolling(window, center=True, min_periods=window // 2).mean().to_numpy()
+    detrended = values - trend
+    cycles = -(-periods // window)
+    padded = np.full((cycles * window, count), np.nan)
+    padded[:periods] = detrended
+    profile = np.nanmedian(padded.reshape(cycles, window, count), axis=0)
+    profile -= profile.mean(axis=0)
+    expected = trend + profile[np.arange(periods) % window]
+    residual = values - expected
+    spread = MAD_SCALE * np.nanmedian(np.abs(residual - np.nanmedian(residual, axis=0)), axis=0)
+    return _zscores(values, expected, spread), expected
+
+def percent_from_mean_scores(values, window=None):
+    """Percentage deviation from each series' overall mean (the original spike/drop rule)."""
+    expected = np.broadcast_to(values.mean(axis=0), values.shape)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = 100 * (values - expected) / np.abs(expected)
+    scores[~np.isfinite(scores)] = np.nan
+    return scores, expected
+
+ANOMALY_METHODS = {
+    "rolling_mad": rolling_mad_scores,
+    "ewma": ewma_scores,
+    "seasonal": seasonal_residual_scores,
+    "percent": percent_from_mean_scores,
+}
+
+def detect_anomalies(matrix, method="rolling_mad", threshold=3.5, granularity="M", window=None):
+    """Score every column of a period x series matrix in one pass and return only the flagged points.
+
+    The result has Period, Series, Value, Expected, Score and Type ("Spike" or
+    "Drop") columns, strongest deviations first. `threshold` is a z-score, or a
+    percentage for the "percent" method.
+    """
+    if window is None:
+        defaults = ANOMALY_GRANULARITIES[granularity]
+        window = defaults["period"] if method == "seasonal" else defaults["window"]
+    values = matrix.to_numpy(dtype=float)
+    scores, expected = ANOMALY_METHODS[method](values, window)
+    rows, cols = np.nonzero(np.abs(np.nan_to_num(scores)) > threshold)
+    flagged = pd.DataFrame({
+        "Period": matrix.index[rows],
+        "Series": matrix.columns[cols],
+        "Value": values[rows, cols],
+        "Expected": expected[rows, cols],
+        "Score": scores[rows, cols],
+    })
+    flagged["Type"] = np.where(flagged["Score"] > 0, "Spike", "Drop")
+    return flagged.sort_values("Score", key=np.abs, ascending=False, ignore_index=True)
+
+# Drill-down path for profitability rankings, coarsest first
+PROFIT_LEVELS = ["Category", "Sub-Category", "Product"]
+
+class ProfitabilityEngine:
+    """Profit margin rankings per Category, Sub-Category or Product, grouped from the dataset's rows.
+
+    A drill-down path resolves to rows through the filter engine's bitmaps and
+    each level's aggregate (within a path) is computed once and cached.
+    Top/bottom-K uses np.argpartition, so ranking K of N members costs
+    O(N + K log K) instead of sorting the whole catalog.
+    """
+
+    MARGIN = "Profit Margin (%)"
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.levels = [name for name in PROFIT_LEVELS if name in dataset.dimensions]
+        self._aggregates = {}
+
+    def aggregate(self, level, path=None):
+        """Sales, profit, orders and margin per member of `level`, within `path` ({parent level: member})."""
+        path = {name: member for name, member in (path or {}).items() if member is not None}
+        key = (level, json.dumps(path, sort_keys=True, default=str))
+        if key not in self._aggregates:
+            rows = self.dataset.filter_engine.select(filters={name: [member] for name, member in path.items()})
+            sales_column, profit_column = self.dataset.sales_column, self.dataset.profit_column
+            table = rows.totals(level, [sales_column, profit_column])
+            sales, profit = table[sales_column].to_numpy(dtype=float), table[profit_column].to_numpy(dtype=float)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                margin = np.where(sales != 0, profit / sales * 100, np.nan)
+            self._aggregates[key] = pd.DataFrame(
+                {"Sales": sales, "Profit": profit, "Orders": table["Orders"].to_numpy(), self.MARGIN: margin},
+                index=table.index,
+            )
+        return self._aggregates[key]
+
+    @staticmethod
+    def _select(values, k, largest):
+        """Positions of the k largest (or smallest) non-NaN values, best first."""
+        positions = np.flatnonzero(~np.isnan(values))
+        keys = -values[positions] if largest else values[positions]
+        if len(positions) > k:
+            keep = np.argpartition(keys, k - 1)[:k]
+            positions, keys = positions[keep], keys[keep]
+        return positions[np.argsort(keys, kind="stable")]
+
+    def rank(self, level, k=3, path=None, by=MARGIN):
+        """(most, least): the `k` members of `level` with the highest and lowest `by`, each best first."""
+        table = self.aggregate(level, path)
+        values = table[by].to_numpy(dtype=float)
+        return table.iloc[self._select(values, k, largest=True)], table.iloc[self._select(values, k, largest=False)]
+
+# Line charts are downsampled to about what a full-width chart can show, and drawn with WebGL when still dense
+CHART_POINTS = 2000
+WEBGL_POINTS = 1000
+
+def _bucket_edges(start, stop, buckets):
+    return np.linspace(start, stop, buckets + 1).astype(np.intp)
+
+def lttb_indices(x, y, points=CHART_POINTS):
+    """Largest-Triangle-Three-Buckets: positions of `points` samples that keep the line's visual shape.
+
+    The first and last points are kept; from each bucket in between, the
+    point forming the largest triangle with the previously kept point and the
+    next bucket's average wins.
+    """
+    n = len(y)
+    if points >= n or points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = _bucket_edges(1, n - 1, points - 2)
+    selected = np.empty(points, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        area = np.abs((x[previous] - avg_x) * (y[lo:hi] - y[previous]) - (x[previous] - x[lo:hi]) * (avg_y - y[previous]))
+        previous = lo + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+def minmax_indices(y, points=CHART_POINTS):
+    """Positions of each bucket's minimum and maximum, so spikes and band edges survive downsampling."""
+    n = len(y)
+    if points >= n or points < 2:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    edges = _bucket_edges(0, n, points // 2)
+    picks = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        picks += [lo + int(np.argmin(y[lo:hi])), lo + int(np.argmax(y[lo:hi]))]
+    return np.unique(picks)
+
+def line_trace(x, y, name, points=CHART_POINTS, method="lttb", **kwargs):
+    """Plotly line trace of at most `points` points, as Scattergl when that is still more than WEBGL_POINTS."""
+    import plotly.graph_objects as go
+
+    x, y = pd.Series(x).reset_index(drop=True), pd.Series(y).reset_index(drop=True)
+    if len(y) > points:
+        if method == "minmax":
+            positions = minmax_indices(y, points)
+        else:
+            numeric_x = x.astype("int64") if pd.api.types.is_datetime64_any_dtype(x.dtype) else np.arange(len(x))
+            positions = lttb_indices(numeric_x, y, points)
+        x, y = x.iloc[positions], y.iloc[positions]
+    trace = go.Scattergl if len(y) > WEBGL_POINTS else go.Scatter
+    return trace(x=x, y=y, name=name, **kwargs)
+
+def forecast_figure(forecast, title, yaxis_title, points=CHART_POINTS):
+    """Forecast line with its confidence bounds; the bounds keep their extremes via min-max bucketing."""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.add_trace(line_trace(forecast['ds'], forecast['yhat'], 'Forecast', points, mode='lines'))
+    fig.add_trace(line_trace(forecast['ds'], forecast['yhat_upper'], 'Upper Bound', points, "minmax", mode='lines', line=dict(dash='dot')))
+    fig.add_trace(line_trace(forecast['ds'], forecast['yhat_lower'], 'Lower Bound', points, "minmax", mode='lines', line=dict(dash='dot')))
+    fig.update_layout(title=title, xaxis_title='Date', yaxis_title=yaxis_title)
+    return fig
+
+class FigureCache:
+    """Built chart figures shared by every session, keyed by (dataset fingerprint, chart, params).
+
+    Figures are treated as read-only once cached; the least recently used are
+    dropped beyond `size`.
+    """
+
+    def __init__(self, size=64):
+        self.size = size
+        self._figures = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """The cached figure for `key`, calling `build()` on a miss."""
+        key = json.dumps(key, sort_keys=True, default=str)
+        with self._lock:
+            figure = self._figures.pop(key, None)
+        if figure is None:
+            figure = build()
+        with self._lock:
+            self._figures[key] = figure  # Re-inserted as the most recently used
+            while len(self._figures) > self.size:
+                del self._figures[next(iter(self._figures))]
+        return figure
+
+@st.cache_resource
+def get_figure_cache():
+    """Process-wide figure cache shared by every session."""
+    return FigureCache()
+
+# Artifacts precomputed by batch.py, one directory per dataset fingerprint
+BATCH_CACHE_DIR = os.path.join(CACHE_DIR, "batch")
+# Bump whenever an artifact's layout changes (e.g. the cube's dimensions), so older runs are ignored
+BATCH_SCHEMA_VERSION = 2
+
+def batch_artifact_dir(fingerprint, directory=BATCH_CACHE_DIR):
+    """Where the artifacts for a dataset fingerprint live under the current schema version."""
+    return os.path.join(directory, f"v{BATCH_SCHEMA_VERSION}", fingerprint)
+
+def batch_artifact_name(kind, **params):
+    """File name stem for an artifact computed with `params`, e.g. forecast-<hash>."""
+    if not params:
+        return kind
+    return f"{kind}-{hashlib.blake2b(json.dumps(params, sort_keys=True, default=str).encode(), digest_size=8).hexdigest()}"
+
+def write_batch_artifact(fingerprint, name, artifact, directory=BATCH_CACHE_DIR):
+    """Store a DataFrame as Parquet, or anything JSON-serializable as JSON, replacing it atomically."""
+    folder = batch_artifact_dir(fingerprint, directory)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{name}.parquet" if isinstance(artifact, pd.DataFrame) else f"{name}.json")
+    partial = f"{path}.partial"
+    if isinstance(artifact, pd.DataFrame):
+        artifact.to_parquet(partial, index=False)
+    else:
+        with open(partial, "w") as f:
+            json.dump(artifact, f, indent=2, default=str)
+    os.replace(partial, path)
+    return path
+
+def read_batch_artifact(fingerprint, name, directory=BATCH_CACHE_DIR):
+    """A precomputed artifact for this dataset, or None if the batch runner has not produced it."""
+    path = os.path.join(batch_artifact_dir(fingerprint, directory), name)
+    try:
+        if os.path.exists(f"{path}.parquet"):
+            return pd.read_parquet(f"{path}.parquet")
+        with open(f"{path}.json") as f:
+            return json.load(f)
+    except (OSError, ValueError, ImportError):
+        return None
+
+# Exchange rates: one bulk fetch per base currency, kept in memory and on disk
+FX_CACHE_DIR = os.path.join(CACHE_DIR, "fx")
+FX_TTL_SECONDS = 3600
+FX_TIMEOUT_SECONDS = 3
+FX_RETRY_SECONDS = 60
+
+class HTTPRateProvider:
+    """Latest rates for a base currency from the free exchangerate-api.com endpoint."""
+
+    def __init__(self, url="https://api.exchangerate-api.com/v4/latest/{base}", timeout=FX_TIMEOUT_SECONDS):
+        self.url = url
+        self.timeout = timeout
+
+    def latest(self, base):
+        response = requests.get(self.url.format(base=base), timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["rates"]
+
+class FileRateProvider:
+    """Rates from a local JSON file, {"base": "USD", "rates": {"EUR": 0.92, ...}}, for offline use.
+
+    Other bases are derived by crossing through the file's base currency.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def latest(self, base):
+        with open(self.path) as f:
+            table = json.load(f)
+        rates = dict(table["rates"])
+        rates[table["base"]] = 1.0
+        if base == table["base"]:
+            return rates
+        return {code: rate / rates[base] for code, rate in rates.items()}
+
+class RateTable:
+    """All rates per base currency, served from memory and refreshed stale-while-revalidate.
+
+    A fresh table is returned as is. A table older than `ttl` is still returned
+    at once while a background job refetches it (at most one attempt per base
+    every FX_RETRY_SECONDS), and the on-disk copy lets a restarted process or
+    an offline one start from the last known rates. Only a base never seen
+    before waits on the provider, bounded by its timeout.
+    """
+
+    def __init__(self, provider, ttl=FX_TTL_SECONDS, directory=FX_CACHE_DIR):
+        self.provider = provider
+        self.ttl = ttl
+        self.directory = directory
+        self._tables = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def _path(self, base):
+        return os.path.join(self.directory, f"{base}.json")
+
+    def _read_disk(self, base):
+        try:
+            with open(self._path(base)) as f:
+                entry = json.load(f)
+            return entry["fetched"], entry["rates"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def refresh(self, base):
+        """Fetch every rate for `base` from the provider and store the table in memory and on disk."""
+        rates = {code: float(rate) for code, rate in self.provider.latest(base).items()}
+        rates[base] = 1.0
+        fetched = time.time()
+        with self._lock:
+            self._tables[base] = (fetched, rates)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            partial = f"{self._path(base)}.{uuid.uuid4().hex}.partial"
+            with open(partial, "w") as f:
+                json.dump({"fetched": fetched, "rates": rates}, f)
+            os.replace(partial, self._path(base))
+        except OSError:
+            pass  # The in-memory table still serves this process
+        return rates
+
+    def _entry(self, base):
+        with self._lock:
+            entry = self._tables.get(base)
+        if entry is None:
+            entry = self._read_disk(base)
+            if entry is not None:
+                with self._lock:
+                    entry = self._tables.setdefault(base, entry)
+        return entry
+
+    def rates(self, base="USD"):
+        """{currency: rate} for `base`; raises the provider's error only if no table was ever loaded."""
+        entry = self._entry(base)
+        if entry is None:
+            # Without any table, fail fast for a while instead of waiting on a down provider every rerun
+            failed_at, error = self._failures.get(base, (0, None))
+            if time.time() - failed_at < FX_RETRY_SECONDS:
+                raise error
+            try:
+                return self.refresh(base)
+            except Exception as e:
+                self._failures[base] = (time.time(), e)
+                raise
+        fetched, rates = entry
+        if time.time() - fetched > self.ttl:
+            # Coalesced per base and minute, so a failing provider is retried at most once per window
+            window = int(time.time() // FX_RETRY_SECONDS)
+            get_executor().submit(BackgroundExecutor.key("fx", "refresh", {"base": base, "window": window}), self.refresh, base)
+        return rates
+
+    def rate(self, base, target):
+        if base == target:
+            return 1.0
+        return self.rates(base)[target]
+
+    def fetched_at(self, base):
+        """When the table for `base` was last fetched, or None."""
+        entry = self._entry(base)
+        return datetime.datetime.fromtimestamp(entry[0]) if entry else None
+
+@st.cache_resource
+def get_rate_table():
+    """Process-wide rate table. Set FX_RATES_FILE to a JSON rate file to run without the network."""
+    path = os.environ.get("FX_RATES_FILE")
+    return RateTable(FileRateProvider(path) if path else HTTPRateProvider())
+
+def fetch_exchange_rate(base_currency: str = "USD", target_currency: str = "USD") -> float:
+    """Exchange rate from the shared rate table, or 1.0 with a warning when none is available."""
+    try:
+        return get_rate_table().rate(base_currency, target_currency)
+    except Exception as e:
+        st.warning(f"Exchange rates are unavailable ({e}). Using default rate of 1.0.")
+        return 1.0
+
+def convert_rollup(table, rate):
+    """Rollup table with every money column (Sales/Profit sums, mins and maxes) converted in one multiply.
+
+    `rate` is a scalar or an array with one rate per row of `table`.
+    """
+    money = [col for col in table.columns
+             if str(col).startswith(("Sales_", "Profit_")) and not str(col).endswith("_count")]
+    factor = np.asarray(rate, dtype=float)
+    if not money or (factor.ndim == 0 and factor == 1.0):
+        return table
+    converted = table.copy(deep=False)
+    converted[money] = table[money].to_numpy(dtype=float) * (factor[:, None] if factor.ndim else factor)
+    return converted
+
+class RateHistory:
+    """Daily rates from one base currency, for converting each order at its order-date rate.
+
+    Lookups are as-of: a date takes the latest rate on or before it (dates
+    before the first row take the first rate, missing dates the last), found
+    for a whole column at once with one binary search pass.
+    """
+
+    def __init__(self, rates, base="USD", source=None):
+        rates = rates.sort_index()
+        self.base = base
+        self.source = source
+        self.dates = rates.index.to_numpy(dtype="datetime64[ns]")
+        self.currencies = {code: rates[code].ffill().bfill().to_numpy(dtype=float) for code in rates.columns}
+        self.currencies[base] = np.ones(len(rates))
+
+    @classmethod
+    def from_csv(cls, path, base="USD"):
+        """Read a wide CSV: a Date column, then one column of `base`-to-currency rates per currency."""
+        rates = pd.read_csv(path, parse_dates=["Date"]).set_index("Date")
+        return cls(rates, base=base, source=f"{path}@{os.path.getmtime(path)}")
+
+    def __contains__(self, currency):
+        return currency in self.currencies
+
+    def rates_on(self, dates, currency):
+        """Rate into `currency` as of each date, as a float array aligned with `dates`."""
+        dates = np.asarray(pd.to_datetime(dates), dtype="datetime64[ns]")
+        positions = np.searchsorted(self.dates, dates, side="right") - 1
+        positions = np.where(np.isnat(dates), len(self.dates) - 1, np.clip(positions, 0, None))
+        return self.currencies[currency][positions]
+
+@st.cache_resource
+def get_rate_history():
+    """Daily rate history from the CSV named by FX_HISTORY_FILE, or None to convert at the spot rate."""
+    path = os.environ.get("FX_HISTORY_FILE")
+    return RateHistory.from_csv(path) if path else None
+
+def currency_conversion(dataset, currency, base="USD"):
+    """Cube and per-order rates for showing `dataset` in `currency`.
+
+    With a rate history covering the currency, every order converts at its
+    order date's rate; the per-row rates and the converted cube are cached
+    with the dataset. Otherwise both use the spot rate. Rates are None for the
+    base currency.
+    """
+    if currency == base:
+        return dataset.cube, None
+    history = get_rate_history()
+    if history is not None and history.base == base and currency in history and dataset.dates is not None:
+        rates = dataset.derived(f"fx:{history.source}:{currency}", lambda ds: history.rates_on(ds.dates, currency))
+        return dataset.cube.in_currency(currency, lambda days: history.rates_on(days, currency), history.source), rates
+    rate = fetch_exchange_rate(base, currency)
+    return dataset.cube.in_currency(currency, rate), rate
+
+# Serialized exports, keyed by data version, filter, format and compression
+EXPORT_CACHE_DIR = os.path.join(CACHE_DIR, "exports")
+EXPORT_CACHE_MB = 2048
+EXPORT_FORMATS = {"CSV": ("csv", "text/csv"), "Parquet": ("parquet", "application/vnd.apache.parquet")}
+CSV_COMPRESSION = {"none": ("", None), "gzip": (".gz", "application/gzip"), "zstd": (".zst", "application/zstd")}
+
+def export_compressions(fmt):
+    """Compression choices for an export format; zstd CSVs need the optional zstandard package."""
+    if fmt == "Parquet":
+        return ["snappy", "gzip", "zstd"]
+    return [name for name in CSV_COMPRESSION if name != "zstd" or importlib.util.find_spec("zstandard")]
+
+def export_file_name(stem, fmt, compression="none"):
+    """Download file name and MIME type for an export."""
+    extension, mime = EXPORT_FORMATS[fmt]
+    if fmt == "CSV" and compression != "none":
+        suffix, mime = CSV_COMPRESSION[compression]
+        extension += suffix
+    return f"{stem}.{extension}", mime
+
+def _open_csv(path, compression):
+    if compression == "gzip":
+        import gzip
+
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    if compression == "zstd":
+        import zstandard
+
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(open(path, "wb")), encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+def _write_export(data, path, fmt, compression, chunk_rows, index):
+    """Serialize `data` to `path` one slice at a time, so no full copy of the output is held in memory."""
+    starts = range(0, max(len(data), 1), chunk_rows)
+    if fmt == "Parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for start in starts:
+                table = pa.Table.from_pandas(data.iloc[start:start + chunk_rows], preserve_index=index,
+                                             schema=writer.schema if writer else None)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema, compression=compression)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        return
+    with _open_csv(path, compression) as handle:
+        for start in starts:
+            data.iloc[start:start + chunk_rows].to_csv(handle, header=start == 0, index=index)
+
+def export_file(data, key, fmt="CSV", compression="none", chunk_rows=100_000, index=False, directory=EXPORT_CACHE_DIR):
+    """Path of `data` serialized as `fmt`, written on first request and reused while `key` is unchanged.
+
+    `key` must identify the data version and any filter applied to it. `data`
+    may be a callable returning the frame, so nothing is computed on a cache hit.
+    """
+    name = batch_artifact_name("export", key=key, fmt=fmt, compression=compression, index=index)
+    path = os.path.join(directory, export_file_name(name, fmt, compression)[0])
+    if os.path.exists(path):
+        os.utime(path)  # Keep recently downloaded exports from being evicted first
+        return path
+    frame = data() if callable(data) else data
+    os.makedirs(directory, exist_ok=True)
+    # A uniquely named temp file, so concurrent sessions exporting the same data never see a partial file
+    fd, partial = tempfile.mkstemp(dir=directory, suffix=".partial")
+    os.close(fd)
+    try:
+        _write_export(frame, partial, fmt, compression, chunk_rows, index)
+        os.replace(partial, path)
+    except BaseException:
+        os.remove(partial)
+        raise
+    evict_export_cache(keep=path, directory=directory)
+    return path
+
+def evict_export_cache(max_mb=EXPORT_CACHE_MB, keep=None, directory=EXPORT_CACHE_DIR):
+    """Drop least recently used exports until the cache fits in `max_mb`, never removing `keep`."""
+    entries = sorted((os.path.getmtime(path), os.path.getsize(path), path)
+                     for path in glob.glob(os.path.join(directory, "export-*")) if path != keep)
+    total = sum(size for _, size, _ in entries) + (os.path.getsize(keep) if keep else 0)
+    for _, size, path in entries:
+        if total <= max_mb * 1024 ** 2:
+            break
+        os.remove(path)
+        total -= size
+
+def lazy_export(data, key, fmt="CSV", compression="none", **options):
+    """Callable for st.download_button that builds (or reuses) the export file only when clicked.
+
+    `data` and `key` may both be callables, evaluated at click time.
+    """
+    def read():
+        with open(export_file(data, key() if callable(key) else key, fmt, compression, **options), "rb") as f:
+            return f.read()
+    return read
+
 def reset_session_state(exclude_keys=None):
     """Reset all session state except for specified keys."""
     if exclude_keys is None:
@@ -161,71 +2186,306 @@ def handle_missing_columns(required_columns, optional_columns=None):
 
     return True
 
-def auto_rename_columns(df, required_columns):
+# Header spellings seen in exports for each logical field, preferred spelling first
+COLUMN_SYNONYMS = {
+    "Order Date": ["order date", "txn date", "transaction date", "invoice date", "sale date", "purchase date",
+                   "order dt", "order timestamp", "date"],
+    "Sales": ["sales", "revenue", "sales amount", "net sales", "gross sales", "turnover", "sale value",
+              "order value", "amount"],
+    "Profit": ["profit", "net profit", "gross profit", "profit amount", "margin", "earnings"],
+    "Product": ["product", "product name", "item name", "item", "product id", "sku", "article"],
+    "Category": ["category", "product category", "department", "dept", "product line"],
+    "Sub-Category": ["sub category", "subcategory", "product subcategory", "sub dept", "product type", "product group"],
+    "Region": ["region", "sales region", "territory", "area", "zone"],
+    "Segment": ["segment", "customer segment", "customer type", "channel"],
+}
+# Value types a candidate column must hold for these fields
+FIELD_KINDS = {"Order Date": "date", "Sales": "number", "Profit": "number"}
+# Fields rows are grouped by. A header only maps to one when it contains a synonym word for word
+# (or scores at least DIMENSION_MIN_SCORE, for typos) and its values are text; otherwise it stays unmapped
+DIMENSION_FIELDS = ["Product", "Category", "Sub-Category", "Region", "Segment"]
+DIMENSION_MIN_SCORE = 0.8
+# Grouping fields (all but Product) must repeat: at most this share of distinct values among sampled rows
+GROUP_MAX_DISTINCT = 0.5
+
+def _normalize_header(name):
+    """'TxnDate', 'txn_date' and 'Txn Date' all become 'txn date'."""
+    name = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", str(name))
+    return " ".join(re.findall(r"[a-z0-9]+", name.lower()))
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _sample_values(series, sample_rows):
+    """Up to `sample_rows` evenly spaced non-null values."""
+    values = series.dropna()
+    if len(values) > sample_rows:
+        values = values.iloc[np.linspace(0, len(values) - 1, sample_rows).astype(int)]
+    return values
+
+def sniff_kind(series, sample_rows=200):
+    """'date', 'number' or 'text', judged from the dtype or an evenly spaced sample of the values."""
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return "date"
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        return "number"
+    values = _sample_values(series, sample_rows)
+    if not len(values):
+        return "text"
+    values = values.astype(str)
+    if pd.to_numeric(values.str.replace(r"[,$€£\s]", "", regex=True), errors="coerce").notna().mean() >= 0.9:
+        return "number"
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        if pd.to_datetime(values, errors="coerce", format="mixed").notna().mean() >= 0.8:
+            return "date"
+    return "text"
+
+class ColumnMapper:
+    """Maps arbitrary headers onto the dashboard's logical fields.
+
+    Each header is normalized and reduced to character trigrams and word
+    tokens; one matrix product against the synonym signatures then scores every
+    header against every field at once (Dice on trigrams, Jaccard on tokens).
+    A small evenly spaced sample of values confirms date and numeric fields
+    and rules out identifiers and free text for dimensions, which also need a
+    synonym in the header. Results are memoized per header signature, so
+    reruns cost a dict lookup.
     """
-    Auto-renames columns in the DataFrame to match the required columns using fuzzy matching.
+
+    def __init__(self, synonyms=COLUMN_SYNONYMS, min_score=0.5, sample_rows=200, cache_size=256):
+        self.fields = list(synonyms)
+        self.min_score = min_score
+        self.sample_rows = sample_rows
+        self.cache_size = cache_size
+        self._cache = {}
+        self._lock = threading.Lock()
+        names = [(field, name, rank) for field, spellings in synonyms.items() for rank, name in enumerate(spellings)]
+        self._synonym_field = np.array([self.fields.index(field) for field, _, _ in names])
+        # Earlier spellings win ties: "product name" beats "product id" for Product
+        self._synonym_rank = np.array([rank for _, _, rank in names]) * 1e-3
+        self._grams = {}
+        self._tokens = {}
+        self._synonym_grams = self._signatures([_trigrams(name) for _, name, _ in names], self._grams, grow=True)
+        self._synonym_tokens = self._signatures([set(name.split()) for _, name, _ in names], self._tokens, grow=True)
+
+    @staticmethod
+    def _signatures(sets, vocabulary, grow=False):
+        """Binary set-membership matrix over `vocabulary`, plus each set's full size."""
+        if grow:
+            for items in sets:
+                for item in items:
+                    vocabulary.setdefault(item, len(vocabulary))
+        matrix = np.zeros((len(sets), len(vocabulary)), dtype=np.float32)
+        for row, items in enumerate(sets):
+            matrix[row, [vocabulary[item] for item in items if item in vocabulary]] = 1
+        return matrix, np.array([len(items) for items in sets], dtype=np.float32)
+
+    def scores(self, columns):
+        """Similarity of every column (rows) to every field (columns), between 0 and 1."""
+        normalized = [_normalize_header(col) for col in columns]
+        grams, gram_sizes = self._signatures([_trigrams(name) for name in normalized], self._grams)
+        tokens, token_sizes = self._signatures([set(name.split()) for name in normalized], self._tokens)
+        synonym_grams, synonym_gram_sizes = self._synonym_grams
+        synonym_tokens, synonym_token_sizes = self._synonym_tokens
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dice = 2 * (grams @ synonym_grams.T) / (gram_sizes[:, None] + synonym_gram_sizes[None, :])
+            shared = tokens @ synonym_tokens.T
+            jaccard = shared / (token_sizes[:, None] + synonym_token_sizes[None, :] - shared)
+        per_synonym = np.nan_to_num(np.maximum(dice, jaccard)) - self._synonym_rank
+        per_field = np.full((len(columns), len(self.fields)), -np.inf)
+        np.maximum.at(per_field.T, self._synonym_field, per_synonym.T)
+        return pd.DataFrame(per_field, index=list(columns), columns=self.fields)
+
+    def named(self, columns):
+        """Whether each column's header contains every word of some synonym of each field."""
+        tokens, _ = self._signatures([set(_normalize_header(col).split()) for col in columns], self._tokens)
+        synonym_tokens, synonym_token_sizes = self._synonym_tokens
+        contained = (tokens @ synonym_tokens.T) >= synonym_token_sizes[None, :]
+        per_field = np.zeros((len(columns), len(self.fields)), dtype=bool)
+        np.logical_or.at(per_field.T, self._synonym_field, contained.T)
+        return pd.DataFrame(per_field, index=list(columns), columns=self.fields)
+
+    def _dimension_like(self, series, field):
+        """Text values that, except for Product, repeat enough to group by (identifiers and free text don't)."""
+        if sniff_kind(series, self.sample_rows) != "text":
+            return False
+        values = _sample_values(series, self.sample_rows)
+        if field == "Product" or len(values) < 20:  # Under 20 rows, repetition can't be judged
+            return True
+        return values.nunique() <= GROUP_MAX_DISTINCT * len(values)
+
+    def map(self, data):
+        """Best column for each field (None where nothing scores well enough).
+
+        `data` is a DataFrame, whose values are sniffed, or just a list of column names.
+        """
+        columns = list(data.columns) if isinstance(data, pd.DataFrame) else list(data)
+        dtypes = tuple(str(dtype) for dtype in data.dtypes) if isinstance(data, pd.DataFrame) else None
+        signature = (tuple(map(str, columns)), dtypes)
+        with self._lock:
+            if signature in self._cache:
+                return dict(self._cache[signature])
+
+        values = self.scores(columns).to_numpy(copy=True)
+        named = self.named(columns).to_numpy()
+        dimensions = [self.fields.index(field) for field in DIMENSION_FIELDS if field in self.fields]
+        for col in dimensions:
+            values[~named[:, col] & (values[:, col] < DIMENSION_MIN_SCORE), col] = -np.inf
+        if isinstance(data, pd.DataFrame):
+            # Only sniff plausible candidates; on a wide file that is a handful of columns
+            for field, kind in FIELD_KINDS.items():
+                col = self.fields.index(field)
+                for position in np.flatnonzero(values[:, col] >= self.min_score):
+                    if sniff_kind(data[columns[position]], self.sample_rows) != kind:
+                        values[position, col] *= 0.5
+            for col in dimensions:
+                for position in np.flatnonzero(values[:, col] >= self.min_score):
+                    if not self._dimension_like(data[columns[position]], self.fields[col]):
+                        values[position, col] = -np.inf
+
+        # Greedy assignment, strongest pairs first, one column per field and field per column
+        mapping = dict.fromkeys(self.fields)
+        for flat in np.argsort(values, axis=None)[::-1]:
+            row, col = divmod(int(flat), len(self.fields))
+            if values[row, col] < self.min_score:
+                break
+            field = self.fields[col]
+            if mapping[field] is None and columns[row] not in mapping.values():
+                mapping[field] = columns[row]
+
+        with self._lock:
+            if len(self._cache) >= self.cache_size:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[signature] = mapping
+        return dict(mapping)
+
+@st.cache_resource
+def get_column_mapper():
+    """Process-wide column mapper, so its memo is shared by every session."""
+    return ColumnMapper()
+
+def suggest_column_map(data):
+    """Best-guess column for each logical field (Order Date, Sales, Profit, Product, Category, Region, Segment)."""
+    return get_column_mapper().map(data)
+
+# Fields the Upload page has a column picker for; each picker falls back to the first column
+PICKED_FIELDS = ["Order Date", "Sales", "Profit", "Product"]
+
+def upload_column_map(data, saved=None):
+    """The column map the Upload page starts from, which batch.py reproduces for the same data.
+
+    The mapper's suggestions, overridden by a `saved` mapping (from the upload
+    cache) where its columns still exist. Picked fields nothing matched get
+    the first column, as their pickers show; other dimensions stay unmapped.
     """
-    renamed_columns = {}
-    for required in required_columns:
-        best_match = difflib.get_close_matches(required, df.columns, n=1, cutoff=0.6)
-        if best_match:
-            renamed_columns[best_match[0]] = required
-    df = df.rename(columns=renamed_columns)
-    return df
+    columns = list(data.columns)
+    suggested = suggest_column_map(data)
+    for field, col in (saved or {}).items():
+        if field in suggested and col in columns:
+            suggested[field] = col
+    column_map = {field: suggested[field] or columns[0] for field in PICKED_FIELDS}
+    column_map.update({field: col for field, col in suggested.items() if field not in column_map and col is not None})
+    return column_map
 
-def generate_summary(data, column_map):
-    try:
-        sales_col = column_map.get("Sales")
-        profit_col = column_map.get("Profit")
-        date_col = column_map.get("Order Date")
-        product_col = column_map.get("Product", None)
-        region_col = column_map.get("Region", None)
-
-        # Ensure date is datetime
-        data[date_col] = pd.to_datetime(data[date_col], errors="coerce")
-        latest_month = data[date_col].dt.to_period("M").max()
-        prev_month = latest_month - 1
-
-        monthly = data.copy()
-        monthly["Month"] = data[date_col].dt.to_period("M")
-        current = monthly[monthly["Month"] == latest_month]
-        previous = monthly[monthly["Month"] == prev_month]
-
-        # Revenue comparison
-        rev_now = current[sales_col].sum()
-        rev_prev = previous[sales_col].sum()
-        rev_growth = ((rev_now - rev_prev) / rev_prev * 100) if rev_prev else 0
-
-        # Profit margin
-        prof_now = current[profit_col].sum()
-        margin = (prof_now / rev_now * 100) if rev_now else 0
-
-        # Top product
-        top_product = None
-        if product_col and product_col in data.columns:
-            top_product = (
-                current.groupby(product_col)[sales_col].sum().idxmax()
-                if not current.empty else None
-            )
+def auto_rename_columns(df, required_columns):
+    """Rename the columns mapped to `required_columns` to those canonical names."""
+    renamed = {
+        col: field for field, col in suggest_column_map(df).items()
+        if field in required_columns and col is not None and col != field and field not in df.columns
+    }
+    return df.rename(columns=renamed)
 
-        # Weakest region (optional)
-        worst_region = None
-        if region_col and region_col in data.columns:
-            worst_region = (
-                current.groupby(region_col)[sales_col].sum().idxmin()
-                if not current.empty else None
-            )
+def _growth(now, previous):
+    return (now - previous) / previous * 100 if previous else 0.0
 
-        summary = f"Revenue {'increased' if rev_growth > 0 else 'decreased'} {abs(rev_growth):.1f}% month-over-month. "
-        summary += f"Profit margin: {margin:.1f}%. "
-        if top_product:
-            summary += f"Top product: *{top_product}*. "
-        if worst_region:
-            summary += f"Slowest region: *{worst_region}*."
+def compute_insights(cube, start=None, end=None, filters=None, dataset=None, rates=None):
+    """Every figure the Dashboard's KPIs and summaries are written from, in one pass over the cube.
+
+    The cells in scope are selected once. Totals and the monthly series come
+    from them, and the region/category rankings only group the cells of the
+    current month or last quarter. Products aren't in the cube, so they are
+    ranked from the current month's rows of `dataset`, with money converted
+    at `rates` (as for Selection.values). Values are None where a measure or
+    dimension isn't mapped or there is no data.
+    """
+    cells = cube.select(start, end, filters)
+    has_sales, has_profit = "Sales" in cube.measures, "Profit" in cube.measures
+    totals = cube.combine(cells, [])
+    insights = {
+        "orders": int(totals["Orders"]),
+        "revenue": float(totals["Sales_sum"]) if has_sales else None,
+        "avg_order_value": float(totals["Sales_sum"] / totals["Sales_count"]) if has_sales and totals["Sales_count"] else None,
+        "profit": float(totals["Profit_sum"]) if has_profit else None,
+        "current_month": None,
+    }
+    monthly = cube.combine(cells, ["Month"]) if has_sales else pd.DataFrame()
+    if monthly.empty:
+        return insights
 
+    current = monthly.index.max()
+    sales = monthly["Sales_sum"]
+    insights.update({
+        "current_month": current,
+        "previous_month": current - 1,
+        "sales_current": float(sales.get(current, 0.0)),
+        "sales_previous": float(sales.get(current - 1, 0.0)),
+        # Mean monthly sales over the three months before the current one, counting empty months as zero
+        "three_month_average": float(sales.reindex(pd.period_range(current - 3, current - 1, freq="M"), fill_value=0.0).mean()),
+        "profit_current": None, "profit_previous": None, "margin": None,
+    })
+    insights["sales_change"] = insights["sales_current"] - insights["sales_previous"]
+    insights["sales_growth"] = _growth(insights["sales_current"], insights["sales_previous"])
+    if has_profit:
+        profit = monthly["Profit_sum"]
+        insights["profit_current"] = float(profit.get(current, 0.0))
+        insights["profit_previous"] = float(profit.get(current - 1, 0.0))
+        insights["profit_change"] = insights["profit_current"] - insights["profit_previous"]
+        insights["profit_growth"] = _growth(insights["profit_current"], insights["profit_previous"])
+        insights["margin"] = insights["profit_current"] / insights["sales_current"] * 100 if insights["sales_current"] else 0.0
+
+    def rank(scope, dimension, measure, best):
+        if measure not in cube.measures:
+            return None
+        if dimension in cube.dimensions:
+            totals = scope.groupby(dimension, observed=True)[f"{measure}_sum"].sum()
+        elif dataset is not None and dimension in dataset.dimensions:
+            # `scope` is the current month's cells; pick the same rows for dimensions outside the cube
+            month_start = current.start_time if start is None else max(current.start_time, pd.Timestamp(start))
+            month_end = current.end_time.normalize() if end is None else min(current.end_time.normalize(), pd.Timestamp(end))
+            rows = dataset.filter_engine.select(start=month_start, end=month_end, filters=filters)
+            totals = rows.totals(dimension, [cube.measures[measure]], rates)[cube.measures[measure]]
+        else:
+            return None
+        return (totals.idxmax() if best else totals.idxmin()) if not totals.empty else None
+
+    this_month = cells[cells["Month"] == current]
+    last_quarter = cells[cells["Quarter"] == current.asfreq("Q") - 1]
+    insights.update({
+        "top_product": rank(this_month, "Product", "Sales", best=True),
+        "most_profitable_product": rank(this_month, "Product", "Profit", best=True),
+        "worst_region": rank(this_month, "Region", "Sales", best=False),
+        "worst_category_last_quarter": rank(last_quarter, "Category", "Profit", best=False),
+    })
+    return insights
+
+def generate_summary(cube, column_map, start=None, end=None, filters=None, insights=None):
+    """One-paragraph month-over-month summary, written from `insights` (computed here if not given)."""
+    try:
+        if insights is None:
+            insights = compute_insights(cube, start=start, end=end, filters=filters)
+        if insights["current_month"] is None:
+            return "Not enough data for insights."
+        rev_growth = insights["sales_growth"]
+        summary = f"Revenue {'increased' if rev_growth > 0 else 'decreased'} {abs(rev_growth):.1f}% month-over-month. "
+        if insights["margin"] is not None:
+            summary += f"Profit margin: {insights['margin']:.1f}%. "
+        if insights["top_product"] is not None and column_map.get("Product"):
+            summary += f"Top product: *{insights['top_product']}*. "
+        if insights["worst_region"] is not None and column_map.get("Region"):
+            summary += f"Slowest region: *{insights['worst_region']}*."
         return summary
     except Exception as e:
         return f"Could not generate summary: {e}"
 
-# Call load_session_state at the start of the app
-load_session_state()
\ No newline at end of file
@@ -1,11 +1,14 @@
-import streamlit as st
 import pandas as pd
-from helper import show_sidebar_guide, load_sample_data, reset_session_state
-import difflib
-from helper import handle_missing_columns, auto_rename_columns
+import streamlit as st
+from helper import show_sidebar_guide, load_sample_data, reset_session_state, get_dataset, read_in_chunks
+from helper import sample_data_key, upload_template
+from helper import COLUMNAR_TYPES, is_columnar, read_upload_file, read_columnar_schema, projected_columns
+from helper import hash_upload, upload_cache_key, load_cached_upload, store_cached_upload, save_cached_column_map
+from helper import handle_missing_columns, auto_rename_columns, suggest_column_map, upload_column_map
+from helper import ProfileBuilder, profile_frame, exact_column_stats
 
 st.title("📤 Upload Your Data")
-st.markdown("Upload your sales data here. Supported formats are **CSV** and **Excel**. "
+st.markdown("Upload your sales data here. Supported formats are **CSV**, **Excel**, **Parquet** and **Arrow/Feather**. "
             "The file should include at least columns for order dates, sales, and profit.")
 
 # Ensure session state variables are initialized
@@ -21,7 +24,23 @@ if 'rerun_trigger' not in st.session_state:
     st.session_state.rerun_trigger = False
 
 # File upload
-file = st.file_uploader("Upload a CSV or Excel file", type=["csv", "xlsx"], help="Supported formats: CSV, Excel.")
+file = st.file_uploader("Upload a CSV, Excel, Parquet or Arrow file", type=["csv", "xlsx"] + COLUMNAR_TYPES,
+                        help="Supported formats: CSV, Excel, Parquet, Arrow IPC/Feather. Columnar files load fastest.")
+
+# Large exports are streamed in chunks so the worker's memory stays bounded
+LARGE_FILE_MB = 50
+with st.expander("⚙️ Large File Options"):
+    stream_upload = st.checkbox(
+        "Stream the file in chunks",
+        value=bool(file and file.size > LARGE_FILE_MB * 1024 ** 2),
+        help=f"Enabled automatically for files over {LARGE_FILE_MB} MB. Columns are downcast chunk by chunk to save memory."
+    )
+    memory_budget_mb = st.number_input("Memory budget (MB)", min_value=64, value=1024, step=64,
+                                       help="Processing stops if the cleaned data would exceed this budget.")
+    project_columns = st.checkbox(
+        "Load only the columns the dashboard uses (Parquet/Arrow)", value=True,
+        help="Reads just the order date, sales, profit and dimension columns from columnar files."
+    )
 
 # Add "Use Sample Data" button
 if st.button("📊 Use Sample Data"):
@@ -33,63 +52,66 @@ if st.button("📊 Use Sample Data"):
 
 # Added loading indicator for file processing
 with st.spinner("Processing file..."):
-    # Enhanced error handling and fallback mechanism for column mapping
-    def map_columns(columns, required, optional):
-        """Map columns with fallback and user-friendly error handling."""
-        mapped_columns = {}
-        for col in required:
-            matches = difflib.get_close_matches(col, columns, n=1, cutoff=0.4)
-            if matches:
-                mapped_columns[col] = matches[0]
-            else:
-                st.warning(f"Required column '{col}' is missing. Please map it manually.")
-                mapped_columns[col] = st.selectbox(f"Select column for '{col}'", options=columns, key=f"map_{col}")
-
-        for col in optional:
-            matches = difflib.get_close_matches(col, columns, n=1, cutoff=0.4)
-            if matches:
-                mapped_columns[col] = matches[0]
-            else:
-                st.info(f"Optional column '{col}' is missing. Related features may be limited.")
-
-        return mapped_columns
-
-    # Automatically clean and preprocess data
-    def clean_data(df):
-        """Handle missing values and correct common data issues."""
-        for col in df.select_dtypes(include=['object']).columns:
-            df[col] = df[col].fillna('Unknown')  # Fill missing strings with 'Unknown'
-        for col in df.select_dtypes(include=['number']).columns:
-            df[col] = df[col].fillna(0)  # Fill missing numbers with 0
-        for col in df.select_dtypes(include=['datetime']).columns:
-            df[col] = pd.to_datetime(df[col], errors='coerce')  # Convert to datetime, handle errors
-        return df
-
-    # Process uploaded file
-    if file:
+    # Process uploaded file (only once per upload, not on every rerun)
+    if file and st.session_state.get("upload_id") != file.file_id:
         try:
-            if file.name.endswith(".csv"):
-                df = pd.read_csv(file, encoding_errors='ignore')
-            elif file.name.endswith(".xlsx"):
-                df = pd.read_excel(file)
+            # Repeat uploads of the same bytes are served from the on-disk cache
+            # Columnar files are already typed; read only the columns we need
+            columns = None
+            if is_columnar(file.name) and project_columns:
+                columns = projected_columns(read_columnar_schema(file, file.name)) or None
+            upload_key = upload_cache_key(hash_upload(file), columns=columns)
+            cached = load_cached_upload(upload_key)
+
+            if cached is not None:
+                df, cached_map = cached
+            elif is_columnar(file.name):
+                df = read_upload_file(file, file.name, columns=columns)
+            elif stream_upload:
+                progress_bar = st.progress(0.0, text="Reading file...")
+
+                def show_progress(rows, fraction, rows_per_sec):
+                    progress_bar.progress(fraction or 0.0, text=f"Read {rows:,} rows ({rows_per_sec:,.0f} rows/sec)")
+
+                # Chunks are cleaned, downcast and profiled as they arrive
+                profiler = ProfileBuilder()
+                df = read_in_chunks(file, file.name, memory_budget_mb=memory_budget_mb,
+                                    progress=show_progress, profiler=profiler)
+                progress_bar.empty()
+                st.session_state.stream_profile = (upload_key, profiler.result())
+            elif file.name.endswith((".csv", ".xlsx")):
+                df = read_upload_file(file, file.name)
             else:
                 st.error("Unsupported file type. Please upload a CSV or Excel file.")
                 st.stop()
 
-            # Clean and preprocess data
-            df = clean_data(df)
-
-            # Auto rename uploaded columns to match expected ones
-            required_columns = ["Order Date", "Sales", "Profit", "Product"]
-            df = auto_rename_columns(df, required_columns)
-            st.session_state.cleaned_data = df
-
-            # Map columns
-            required_columns = ["Order Date", "Sales", "Profit"]
-            optional_columns = ["Product", "Category"]
-            st.session_state.column_map = map_columns(df.columns, required_columns, optional_columns)
-
-            st.success("✅ File processed successfully. You can now explore the data.")
+            if cached is not None:
+                st.session_state.cleaned_data = df
+                st.session_state.column_map = cached_map
+                st.session_state.cached_column_map = cached_map
+            else:
+                # Auto rename uploaded columns to match expected ones
+                required_columns = ["Order Date", "Sales", "Profit", "Product"]
+                df = auto_rename_columns(df, required_columns)
+                st.session_state.cleaned_data = df
+
+                # Map columns (memoized per header signature, so reruns don't redo the matching)
+                column_map = suggest_column_map(df)
+                for col in ["Order Date", "Sales", "Profit"]:
+                    if column_map[col] is None:
+                        st.warning(f"Required column '{col}' is missing. Please map it manually below.")
+                for col in ["Product", "Category"]:
+                    if column_map[col] is None:
+                        st.info(f"Optional column '{col}' is missing. Related features may be limited.")
+                st.session_state.column_map = {key: col for key, col in column_map.items() if col is not None}
+                store_cached_upload(upload_key, df, st.session_state.column_map)
+            st.session_state.upload_id = file.file_id
+            st.session_state.upload_key = upload_key
+            # Sessions uploading the same bytes share one dataset in the process-wide store
+            st.session_state.data_key = upload_key
+
+            st.success("✅ File processed successfully. You can now explore the data." if cached is None
+                       else "✅ File loaded from cache. You can now explore the data.")
         except Exception as e:
             st.error(f"An error occurred while processing the file: {e}")
             st.stop()
@@ -98,7 +120,7 @@ with st.spinner("Processing file..."):
 st.markdown("### 📥 Download Template")
 st.download_button(
     label="Download Upload Template",
-    data=open("superstore.csv", "rb").read(),
+    data=upload_template(sample_data_key()),
     file_name="upload_template.csv",
     mime="text/csv",
     help="Download a sample template to format your data correctly."
@@ -127,27 +149,25 @@ if st.session_state.cleaned_data is not None:
     # Updated column mapping logic to rely on fuzzy matching
     columns = st.session_state.cleaned_data.columns
 
-    default_map = {
-        "Order Date": difflib.get_close_matches("Order Date", columns, n=1, cutoff=0.6),
-        "Sales": difflib.get_close_matches("Sales", columns, n=1, cutoff=0.6),
-        "Profit": difflib.get_close_matches("Profit", columns, n=1, cutoff=0.6),
-        "Product": difflib.get_close_matches("Product", columns, n=1, cutoff=0.5)
-    }
-
-    # Enhanced fallback mechanism for Product column mapping
-    product_candidates = [col for col in columns if "product" in col.lower() or "name" in col.lower()]
-    if not default_map["Product"] and product_candidates:
-        default_map["Product"] = [product_candidates[0]]  # Select the first match as fallback
-
-    # Adjust fuzzy matching threshold for Product
-    default_map["Product"] = difflib.get_close_matches("Product", columns, n=1, cutoff=0.4) or default_map["Product"]
+    # A mapping saved with a cached upload wins over fuzzy matching; batch.py starts from the same map
+    default_map = upload_column_map(st.session_state.cleaned_data, st.session_state.get("cached_column_map"))
 
     st.session_state.column_map = {
-        "Order Date": st.selectbox("Select Order Date Column", options=columns, index=columns.get_loc(default_map["Order Date"][0]) if default_map["Order Date"] else 0),
-        "Sales": st.selectbox("Select Sales Column", options=columns, index=columns.get_loc(default_map["Sales"][0]) if default_map["Sales"] else 0),
-        "Profit": st.selectbox("Select Profit Column", options=columns, index=columns.get_loc(default_map["Profit"][0]) if default_map["Profit"] else 0),
-        "Product": st.selectbox("Select Product Column", options=columns, index=columns.get_loc(default_map["Product"][0]) if default_map["Product"] else 0)
+        "Order Date": st.selectbox("Select Order Date Column", options=columns, index=columns.get_loc(default_map["Order Date"])),
+        "Sales": st.selectbox("Select Sales Column", options=columns, index=columns.get_loc(default_map["Sales"])),
+        "Profit": st.selectbox("Select Profit Column", options=columns, index=columns.get_loc(default_map["Profit"])),
+        "Product": st.selectbox("Select Product Column", options=columns, index=columns.get_loc(default_map["Product"]))
     }
+    # Dimensions aren't picked by hand; keep the columns the mapper found for them
+    for key in ["Category", "Sub-Category", "Region", "Segment"]:
+        if default_map.get(key):
+            st.session_state.column_map[key] = default_map[key]
+
+    # Persist the chosen mapping with the cached upload
+    upload_key = st.session_state.get("upload_key")
+    if upload_key and st.session_state.column_map != st.session_state.get("cached_column_map"):
+        save_cached_column_map(upload_key, st.session_state.column_map)
+        st.session_state.cached_column_map = dict(st.session_state.column_map)
 
     # Highlight user-selected columns
     st.markdown("### Selected Columns")
@@ -164,6 +184,7 @@ if st.session_state.cleaned_data is not None:
         "Sales": "Revenue from each order (required)",
         "Profit": "Profit from each order (required)",
         "Category": "Product category (optional, enables filters)",
+        "Sub-Category": "Product sub-category (optional, enables profitability drill-down)",
         "Region": "Customer region (optional, enables filters)",
         "Segment": "Customer segment (optional, enables filters)",
         "Product": "Product name (optional, enables product insights)"
@@ -178,5 +199,26 @@ if st.session_state.cleaned_data is not None:
         else:
             st.warning(f"⚠️ **{col}** not found — {desc}")
 
+    # Build the typed dataset every page reads (no-op unless the data or mapping changed)
+    dataset = get_dataset()
+
+    # Profile from a sample so large files summarize in well under a second
+    st.markdown("### 📋 Data Profile")
+    stream_key, profile = st.session_state.get("stream_profile", (None, None))
+    if stream_key is None or stream_key != st.session_state.get("data_key"):
+        profile = dataset.derived("profile", lambda ds: profile_frame(ds.frame))
+    if profile.estimated:
+        st.caption(f"Based on a sample of {len(profile.sample):,} of {profile.rows:,} rows. "
+                   "Null shares and distinct counts are estimates; min, median and max come from the sample.")
+    else:
+        st.caption(f"All {profile.rows:,} rows profiled.")
+    st.dataframe(profile.summary(), hide_index=True)
+
+    with st.expander("🔍 Exact statistics for one column"):
+        exact_col = st.selectbox("Column", options=dataset.columns, key="exact_stats_column")
+        if st.button("Compute exact statistics"):
+            stats = dataset.derived(f"exact:{exact_col}", lambda ds: exact_column_stats(ds.column(exact_col)))
+            st.dataframe(pd.Series(stats, name=exact_col, dtype=object).astype(str))
+
 # ✅ Show sidebar nav
 show_sidebar_guide()
\ No newline at end of file
@@ -1,14 +1,10 @@
 import streamlit as st
-from prophet import Prophet
+import pandas as pd
+import time
 import plotly.graph_objects as go
-from helper import show_sidebar_guide, handle_missing_columns
-
-@st.cache_resource
-def compute_forecast(data, months):
-    m = Prophet()
-    m.fit(data)
-    future = m.make_future_dataframe(periods=months * 30)
-    return m.predict(future)
+from helper import show_sidebar_guide, get_dataset, compute_forecast, split_series, forecast_many
+from helper import read_batch_artifact, batch_artifact_name, get_executor, get_forecast_store
+from helper import forecast_figure, get_figure_cache
 
 if 'selected_currency' not in st.session_state:
     st.session_state.selected_currency = "USD"
@@ -16,16 +12,43 @@ if 'selected_currency' not in st.session_state:
 st.title("📈 Forecasting")
 st.markdown("Using historical data, this page forecasts future **Sales** or **Profit** for the selected number of months.")
 
-# Read data from session state
-data = st.session_state.get('cleaned_data', None)
-if data is None:
+# Read the typed dataset built at upload time
+dataset = get_dataset()
+if dataset is None:
     st.error("No data available. Please upload a file on the Upload page.")
     st.stop()
+data = dataset.frame
+
+# Forecasts run on a background executor shared by every session; pages poll it between reruns
+executor = get_executor()
+POLL_SECONDS = 1.0
+
+# Fast engines return in milliseconds; Prophet is slower but more accurate
+FAST_ENGINES = {
+    "Linear trend + seasonality": "linear_seasonal",
+    "Holt-Winters smoothing": "holt_winters",
+    "Seasonal naive": "seasonal_naive",
+}
 
 # Forecast settings
 with st.expander("Forecast Settings"):
+    engine_choice = st.radio("Forecast engine", ["Accurate (Prophet)", "Fast"], horizontal=True,
+                             help="Fast engines are simple statistical models that respond instantly; Prophet takes a few seconds to fit.")
+    engine = "prophet"
+    if engine_choice == "Fast":
+        engine = FAST_ENGINES[st.selectbox("Fast method", list(FAST_ENGINES))]
     months = st.slider("Select number of months to forecast:", 1, 12, 3)
     forecast_metric = st.selectbox("Select Metric to Forecast", ['Sales', 'Profit'])
+    seasonality_mode = st.selectbox("Seasonality mode", ["additive", "multiplicative"],
+                                    help="Multiplicative suits series whose seasonal swings grow with the trend.")
+    yearly_seasonality = st.checkbox("Yearly seasonality", value=True)
+    weekly_seasonality = st.checkbox("Weekly seasonality", value=True)
+
+settings = {
+    "seasonality_mode": seasonality_mode,
+    "yearly_seasonality": yearly_seasonality,
+    "weekly_seasonality": weekly_seasonality,
+}
 
 # Global column map helper
 order_date_column = st.session_state.column_map.get('Order Date')
@@ -34,28 +57,46 @@ order_date_column = st.session_state.column_map.get('Order Date')
 if not order_date_column or order_date_column not in data.columns:
     st.warning("Order Date column is missing or not mapped. Forecasting may not be available.")
 
-# Graceful feature skipping
+# Graceful feature skipping; the summary below only shows when a forecast was produced
+forecast = None
 try:
-    df_daily = data.groupby(order_date_column).agg({forecast_metric: 'sum'}).reset_index()
+    if dataset.dates is None:
+        raise KeyError(order_date_column)
+    df_daily = dataset.cube.query(by=["Day"])[f"{forecast_metric}_sum"].reset_index()
     df_daily.columns = ['ds', 'y']
 
     if df_daily['y'].dropna().shape[0] < 2:
         st.error("Not enough data to forecast. Please upload more data or adjust your filters.")
         st.stop()
 
-    # Perform forecasting
-    forecast = compute_forecast(df_daily, months)
+    # Use the batch runner's forecast if it has one, otherwise forecast (the fitted model is reused across horizon changes)
+    forecast = read_batch_artifact(dataset.fingerprint, batch_artifact_name("forecast", metric=forecast_metric, months=months, settings=settings, engine=engine))
     if forecast is None:
-        st.stop()
+        # Runs on the shared executor: reruns and other sessions asking for the same forecast reuse the job
+        params = {"metric": forecast_metric, "months": months, "settings": settings, "engine": engine}
+        key = executor.key(dataset.fingerprint, "forecast", params)
+        job = executor.submit(key, compute_forecast,
+                              df_daily, months, forecast_metric, dataset.fingerprint, settings, get_forecast_store(), engine)
+        if not job.wait(timeout=0.5):
+            st.info("⏳ Forecasting in the background. You can keep adjusting the settings; the chart appears here when it's ready.")
+            time.sleep(POLL_SECONDS)
+            st.rerun()
+        try:
+            forecast = job.result()
+        except Exception as e:
+            # Dropped so the next run fits again rather than replaying this error
+            executor.discard(key)
+            st.error(f"Forecasting failed: {e}")
 
-    # Display forecast chart
-    st.subheader("Forecast Chart")
-    fig1 = go.Figure()
-    fig1.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat'], mode='lines', name='Forecast'))
-    fig1.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat_upper'], mode='lines', name='Upper Bound', line=dict(dash='dot')))
-    fig1.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat_lower'], mode='lines', name='Lower Bound', line=dict(dash='dot')))
-    fig1.update_layout(title='Revenue Forecast (with Confidence Interval)', xaxis_title='Date', yaxis_title=f"{forecast_metric} ({st.session_state.selected_currency})")
-    st.plotly_chart(fig1)
+    if forecast is not None:
+        # Display forecast chart
+        st.subheader("Forecast Chart")
+        # Downsampled once per forecast and shared, so reruns only re-send a few thousand points
+        yaxis_title = f"{forecast_metric} ({st.session_state.selected_currency})"
+        fig1 = get_figure_cache().get(
+            (dataset.fingerprint, "forecast", forecast_metric, months, settings, engine, yaxis_title),
+            lambda: forecast_figure(forecast, 'Revenue Forecast (with Confidence Interval)', yaxis_title))
+        st.plotly_chart(fig1)
 except KeyError as e:
     st.info(f"Forecasting couldn't be generated because a required column is missing: {e}")
 
@@ -65,21 +106,98 @@ st.markdown("### 📅 Forecasting _(requires: Order Date)_")
 show_sidebar_guide()
 
 # Display forecast summary
-st.subheader("Forecast Summary (Month by Month)")
-forecast['Month'] = forecast['ds'].dt.to_period('M').dt.to_timestamp()
-monthly_forecast = forecast.groupby('Month')['yhat'].sum().reset_index()
-
-fig2 = go.Figure()
-fig2.add_trace(go.Bar(
-    x=monthly_forecast['Month'],
-    y=monthly_forecast['yhat'],
-    name='Forecasted Revenue',
-    marker_color='blue'
-))
-fig2.update_layout(
-    title='Forecast Summary (Month by Month)',
-    xaxis_title='Month',
-    yaxis_title=f"{forecast_metric} ({st.session_state.selected_currency})",
-    showlegend=True
-)
-st.plotly_chart(fig2)
\ No newline at end of file
+if forecast is not None:
+    st.subheader("Forecast Summary (Month by Month)")
+    # The forecast may be shared with other sessions, so group by a derived key instead of adding a column
+    forecast_month = forecast['ds'].dt.to_period('M').dt.to_timestamp().rename('Month')
+    monthly_forecast = forecast['yhat'].groupby(forecast_month).sum().reset_index()
+
+    fig2 = go.Figure()
+    fig2.add_trace(go.Bar(
+        x=monthly_forecast['Month'],
+        y=monthly_forecast['yhat'],
+        name='Forecasted Revenue',
+        marker_color='blue'
+    ))
+    fig2.update_layout(
+        title='Forecast Summary (Month by Month)',
+        xaxis_title='Month',
+        yaxis_title=f"{forecast_metric} ({st.session_state.selected_currency})",
+        showlegend=True
+    )
+    st.plotly_chart(fig2)
+# Batch forecasts per Category / Region / Product
+st.subheader("🧩 Forecast by Dimension")
+st.markdown("Forecast every category, region or product separately. Series are fitted in parallel and appear as soon as each one finishes.")
+
+available_dimensions = [name for name in ["Category", "Region", "Segment", "Product"] if name in dataset.dimensions]
+if dataset.dates is None or not available_dimensions:
+    st.info("Batch forecasting needs an Order Date column and at least one of Category, Region, Segment or Product.")
+else:
+    with st.expander("Batch Settings"):
+        batch_dimension = st.selectbox("Forecast each", available_dimensions)
+        batch_top = st.number_input("Number of series (largest first)", min_value=1, max_value=1000, value=10)
+        batch_timeout = st.number_input("Timeout per series (seconds)", min_value=10, max_value=1800, value=120)
+
+    if st.button("Run Batch Forecast"):
+        series, skipped = split_series(dataset.rollup(batch_dimension), batch_dimension, forecast_metric, top=int(batch_top))
+        # Members the batch runner already forecast are read back; only the rest are fitted here
+        table = read_batch_artifact(dataset.fingerprint, batch_artifact_name("member_forecasts", dimension=batch_dimension, metric=forecast_metric,
+                                                                             months=months, settings=settings, engine=engine))
+        stored = dict(list(table.groupby("Series"))) if table is not None else {}
+        precomputed = {name: stored[str(name)].drop(columns="Series").reset_index(drop=True) for name in series if str(name) in stored}
+        remaining = {name: history for name, history in series.items() if name not in precomputed}
+        params = {"dimension": batch_dimension, "top": int(batch_top), "metric": forecast_metric, "months": months,
+                  "settings": settings, "engine": engine, "timeout": int(batch_timeout)}
+        key = executor.key(dataset.fingerprint, "forecast_many", params)
+        executor.submit(key, forecast_many, remaining, months, forecast_metric, dataset.fingerprint, settings,
+                        timeout=batch_timeout, engine=engine, stream=True)
+        st.session_state.batch_job = {"key": key, "dimension": batch_dimension, "metric": forecast_metric,
+                                      "histories": {name: history['ds'].max() for name, history in series.items()},
+                                      "precomputed": precomputed, "skipped": skipped}
+        st.session_state.pop("batch_forecasts", None)
+
+    # The batch keeps running in the background across reruns; show whatever has finished so far
+    batch_job = st.session_state.get("batch_job")
+    job = executor.get(batch_job["key"]) if batch_job else None
+    if job is not None and "batch_forecasts" not in st.session_state:
+        rows, results = [], {}
+        produced = [(name, result, None) for name, result in batch_job["precomputed"].items()] + list(job.partial)
+        for name, result, error in produced:
+            if error is None:
+                results[name] = result
+                horizon = result[result['ds'] > batch_job["histories"][name]]
+                rows.append({batch_job["dimension"]: name, "Forecast Total": horizon['yhat'].sum(), "Status": "✅ Done"})
+            else:
+                rows.append({batch_job["dimension"]: name, "Forecast Total": None, "Status": f"❌ {error}"})
+        total = len(batch_job["histories"])
+        finished = len(rows)
+        for name, days in batch_job["skipped"].items():
+            rows.append({batch_job["dimension"]: name, "Forecast Total": None,
+                         "Status": f"⏭️ Skipped: orders on only {days} days"})
+        if not job.done():
+            st.progress(finished / max(total, 1), text=f"Finished {finished} of {total} series")
+            if rows:
+                st.dataframe(pd.DataFrame(rows))
+            time.sleep(POLL_SECONDS)
+            st.rerun()
+        try:
+            job.result()
+            st.session_state.batch_forecasts = {"dimension": batch_job["dimension"], "metric": batch_job["metric"], "results": results, "table": pd.DataFrame(rows)}
+        except Exception as e:
+            st.error(f"Batch forecast failed: {e}")
+            executor.discard(batch_job["key"])
+            del st.session_state["batch_job"]
+
+    batch = st.session_state.get("batch_forecasts")
+    if batch:
+        st.dataframe(batch["table"])
+    if batch and batch["results"]:
+        selected_series = st.selectbox(f"View forecast for {batch['dimension']}", list(batch["results"]))
+        series_forecast = batch["results"][selected_series]
+        yaxis_title = f"{batch['metric']} ({st.session_state.selected_currency})"
+        fig3 = get_figure_cache().get(
+            (dataset.fingerprint, "series-forecast", batch["dimension"], batch["metric"], selected_series,
+             series_forecast['ds'].iloc[-1], yaxis_title),
+            lambda: forecast_figure(series_forecast, f"{batch['metric']} Forecast — {selected_series}", yaxis_title))
+        st.plotly_chart(fig3)
@@ -1,5 +1,5 @@
 import streamlit as st
-from helper import show_sidebar_guide
+from helper import show_sidebar_guide, get_dataset, ProfitabilityEngine
 
 if 'selected_currency' not in st.session_state:
     st.session_state.selected_currency = "USD"
@@ -9,11 +9,12 @@ st.markdown("💰 This page shows which categories or products are the most (or
 
 show_sidebar_guide()
 
-# Read data from session state
-data = st.session_state.get('cleaned_data', None)
-if data is None:
+# Read the typed dataset built at upload time
+dataset = get_dataset()
+if dataset is None:
     st.error("No data available. Please upload a file on the Upload page.")
     st.stop()
+data = dataset.frame
 
 # Global column map helper
 profit_column = st.session_state.column_map.get('Profit')
@@ -26,39 +27,49 @@ if not profit_column or profit_column not in data.columns:
 if not sales_column or sales_column not in data.columns:
     st.warning("Sales column is missing or not mapped. Profitability insights may not be available.")
 
-# Profitability insights
-view_option = st.radio("View Profitability Insights for:", ["Categories", "Products"])
+# Rankings are grouped from the rows once per level and drill-down path, and cached with the dataset
+engine = dataset.derived("profitability", ProfitabilityEngine)
+labels = {"Category": "Categories", "Sub-Category": "Sub-Categories", "Product": "Products"}
+# Show the measures under the names they have in the uploaded file
+headers = {"Sales": sales_column or "Sales", "Profit": profit_column or "Profit"}
 
 # Graceful feature skipping
 try:
-    if view_option == "Categories" and 'Category' in data.columns:
-        profitability = data.groupby('Category').agg({'Profit': 'sum', 'Sales': 'sum'}).reset_index()
-        profitability['Profit Margin (%)'] = (profitability['Profit'] / profitability['Sales']) * 100
-        most_profitable = profitability.sort_values(by='Profit Margin (%)', ascending=False).head(3)
-        least_profitable = profitability.sort_values(by='Profit Margin (%)').head(3)
+    if profit_column not in dataset.columns or sales_column not in dataset.columns:
+        raise KeyError(profit_column if profit_column not in dataset.columns else sales_column)
+    if not engine.levels:
+        st.warning("The selected option is not available or required columns are not mapped correctly.")
+        st.stop()
 
-        col1, col2 = st.columns(2)
-        with col1:
-            st.subheader("Top 3 Most Profitable Categories")
-            st.dataframe(most_profitable)
-        with col2:
-            st.subheader("Top 3 Least Profitable Categories")
-            st.dataframe(least_profitable)
-    elif view_option == "Products" and product_column and product_column in data.columns:
-        profitability = data.groupby(product_column).agg({"Profit": "sum", "Sales": "sum"}).reset_index()
-        profitability['Profit Margin (%)'] = (profitability['Profit'] / profitability['Sales']) * 100
-        most_profitable = profitability.sort_values(by='Profit Margin (%)', ascending=False).head(3)
-        least_profitable = profitability.sort_values(by='Profit Margin (%)').head(3)
+    # Profitability insights
+    view_option = st.radio("View Profitability Insights for:", [labels[level] for level in engine.levels], horizontal=True)
+    level = next(name for name in engine.levels if labels[name] == view_option)
+    top_k = st.slider("How many to rank", 1, 50, 3, help="Rankings use partial selection, so deeper lists stay fast on large catalogs.")
 
-        col1, col2 = st.columns(2)
-        with col1:
-            st.subheader("Top 3 Most Profitable Products")
-            st.dataframe(most_profitable)
-        with col2:
-            st.subheader("Top 3 Least Profitable Products")
-            st.dataframe(least_profitable)
-    else:
-        st.warning("The selected option is not available or required columns are not mapped correctly.")
+    # Drill down through the coarser levels above the one being ranked
+    path = {}
+    parents = engine.levels[:engine.levels.index(level)]
+    if parents:
+        drill_columns = st.columns(len(parents))
+        for parent, column in zip(parents, drill_columns):
+            members = engine.aggregate(parent, path).index.tolist()
+            choice = column.selectbox(f"Within {parent}", ["All"] + members)
+            if choice == "All":
+                break
+            path[parent] = choice
+
+    most_profitable, least_profitable = engine.rank(level, top_k, path)
+    ranked = len(engine.aggregate(level, path))
+    scope = " › ".join(str(member) for member in path.values())
+    st.caption(f"{ranked:,} {labels[level].lower()} ranked by profit margin" + (f" within {scope}." if scope else "."))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader(f"Top {top_k} Most Profitable {labels[level]}")
+        st.dataframe(most_profitable.rename(columns=headers))
+    with col2:
+        st.subheader(f"Top {top_k} Least Profitable {labels[level]}")
+        st.dataframe(least_profitable.rename(columns=headers))
 except KeyError as e:
     st.info(f"Profitability insights couldn't be generated because a required column is missing: {e}")
 
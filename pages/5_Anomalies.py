@@ -1,16 +1,20 @@
 import streamlit as st
 import plotly.graph_objects as go
-import pandas as pd
-from helper import show_sidebar_guide, handle_missing_columns
+from helper import show_sidebar_guide, get_dataset, anomaly_matrix, detect_anomalies
+from helper import read_batch_artifact, batch_artifact_name, line_trace, get_figure_cache
+
+# Most flagged points listed under the chart
+TABLE_ROWS = 200
 
 st.title("⚠️ Revenue Anomalies")
-st.markdown("This page helps you identify months where revenue was unusually high (**spike**) or low (**drop**) compared to the average.")
+st.markdown("This page helps you identify periods where revenue was unusually high (**spike**) or low (**drop**) compared to what was expected.")
 
-# Read data from session state
-data = st.session_state.get('cleaned_data', None)
-if data is None:
+# Read the typed dataset built at upload time
+dataset = get_dataset()
+if dataset is None:
     st.error("No data available. Please upload a file on the Upload page.")
     st.stop()
+data = dataset.frame
 
 if 'selected_currency' not in st.session_state:
     st.session_state.selected_currency = "USD"
@@ -27,50 +31,94 @@ if not sales_column or sales_column not in data.columns:
 
 # Graceful feature skipping
 try:
-    data[order_date_column] = pd.to_datetime(data[order_date_column], errors='coerce')
+    if dataset.dates is None:
+        raise KeyError(order_date_column)
+
+    cube = dataset.cube
+    granularities = {"Monthly": "M", "Weekly": "W", "Daily": "D"}
+    # Robust scores first; "% from average" flags most points of short or sparse series, so only the total gets it
+    methods = {
+        "Rolling median / MAD": "rolling_mad",
+        "EWMA z-score": "ewma",
+        "Seasonal residual": "seasonal",
+        "% from average": "percent",
+    }
 
     # Anomaly detection settings
     with st.expander("Anomaly Detection Settings"):
-        sensitivity = st.slider("Anomaly Detection Sensitivity (% from average)", 10, 100, 30)
+        granularity_label = st.radio("Granularity", list(granularities), horizontal=True)
+        scan_by = st.selectbox("Scan each series of", ["Total"] + list(dataset.dimensions))
+        if scan_by != "Total":
+            methods.pop("% from average")
+        method_label = st.selectbox("Detection method", list(methods))
+        if methods[method_label] == "percent":
+            sensitivity = st.slider("Anomaly Detection Sensitivity (% from average)", 10, 100, 30)
+        else:
+            sensitivity = st.slider("Anomaly Detection Threshold (z-score)", 2.0, 6.0, 3.5, 0.5)
+    granularity = granularities[granularity_label]
+    method = methods[method_label]
 
-    # Perform anomaly detection
-    data['Month'] = data[order_date_column].dt.to_period("M")
-    monthly_revenue = data.groupby('Month')[sales_column].sum().reset_index()
-    monthly_revenue['Month'] = monthly_revenue['Month'].dt.to_timestamp()
-    mean = monthly_revenue[sales_column].mean()
-    thresh = (sensitivity / 100) * mean
-    monthly_revenue['Type'] = monthly_revenue[sales_column].apply(lambda x: 'Spike' if x > mean + thresh else ('Drop' if x < mean - thresh else 'Normal'))
+    # Perform anomaly detection over every series at once, or narrow down a batch-precomputed table
+    # Dimensions outside the shared cube (Sub-Category, Product) get their own day x dimension rollup
+    dimension = None if scan_by == "Total" else scan_by
+    revenue = anomaly_matrix(dataset.rollup(dimension) if dimension else cube, "Sales", granularity, dimension)
+    precomputed = read_batch_artifact(dataset.fingerprint, batch_artifact_name("anomalies", granularity=granularity, method=method, dimension=dimension))
+    if precomputed is not None:
+        anomalies = precomputed[precomputed["Score"].abs() > sensitivity].reset_index(drop=True)
+    else:
+        anomalies = detect_anomalies(revenue, method, sensitivity, granularity)
+    series_name = "Total"
+    if scan_by != "Total":
+        ranked = anomalies["Series"].value_counts().index.tolist()
+        series_name = st.selectbox(f"{scan_by} to chart", ranked + [name for name in revenue.columns if name not in ranked])
+    flagged = anomalies[anomalies["Series"] == series_name]
+    spikes = flagged[flagged["Type"] == "Spike"]
+    drops = flagged[flagged["Type"] == "Drop"]
 
-    # Display anomaly chart
-    fig3 = go.Figure()
-    fig3.add_trace(go.Scatter(
-        x=monthly_revenue['Month'],
-        y=monthly_revenue[sales_column],
-        mode='lines+markers',
-        name='Monthly Revenue',
-        line=dict(color='gray')
-    ))
-    fig3.add_trace(go.Scatter(
-        x=monthly_revenue[monthly_revenue['Type'] == 'Spike']['Month'],
-        y=monthly_revenue[monthly_revenue['Type'] == 'Spike'][sales_column],
-        mode='markers',
-        name='Spike',
-        marker=dict(color='red', size=10)
-    ))
-    fig3.add_trace(go.Scatter(
-        x=monthly_revenue[monthly_revenue['Type'] == 'Drop']['Month'],
-        y=monthly_revenue[monthly_revenue['Type'] == 'Drop'][sales_column],
-        mode='markers',
-        name='Drop',
-        marker=dict(color='blue', size=10)
-    ))
-    fig3.update_layout(
-        title='Monthly Revenue with Spikes and Drops',
-        xaxis_title='Month',
-        yaxis_title=f"Sales ({st.session_state.selected_currency})",
-        showlegend=True
-    )
+    # Display anomaly chart; long daily series are downsampled and the figure is shared across reruns
+    def build_chart():
+        fig3 = go.Figure()
+        fig3.add_trace(line_trace(
+            revenue.index,
+            revenue[series_name],
+            f'{granularity_label} Revenue',
+            mode='lines+markers',
+            line=dict(color='gray')
+        ))
+        fig3.add_trace(go.Scatter(
+            x=spikes['Period'],
+            y=spikes['Value'],
+            mode='markers',
+            name='Spike',
+            marker=dict(color='red', size=10)
+        ))
+        fig3.add_trace(go.Scatter(
+            x=drops['Period'],
+            y=drops['Value'],
+            mode='markers',
+            name='Drop',
+            marker=dict(color='blue', size=10)
+        ))
+        fig3.update_layout(
+            title=f'{granularity_label} Revenue with Spikes and Drops' + ('' if series_name == 'Total' else f' ({series_name})'),
+            xaxis_title='Period',
+            yaxis_title=yaxis_title,
+            showlegend=True
+        )
+        return fig3
+
+    yaxis_title = f"Sales ({st.session_state.selected_currency})"
+    fig3 = get_figure_cache().get(
+        (dataset.fingerprint, "anomalies", granularity, method, sensitivity, dimension, series_name, yaxis_title),
+        build_chart)
     st.plotly_chart(fig3)
+
+    st.subheader("🚩 Flagged Points")
+    # Rows come strongest first, so the cap keeps the points worth looking at
+    shown = anomalies.head(TABLE_ROWS)
+    st.caption(f"{len(anomalies)} anomalies across {revenue.shape[1]} series."
+               + (f" Showing the {len(shown)} with the largest scores." if len(shown) < len(anomalies) else ""))
+    st.dataframe(shown)
 except KeyError as e:
     st.info(f"Anomaly detection couldn't be generated because a required column is missing: {e}")
 
@@ -1,14 +1,15 @@
 import streamlit as st
-from helper import show_sidebar_guide
+from helper import show_sidebar_guide, get_dataset, export_compressions, export_file_name, lazy_export, RowFilter
 
 if 'selected_currency' not in st.session_state:
     st.session_state.selected_currency = "USD"
 
 st.title("💾 Export Data")
-st.markdown("Download the filtered dataset as a CSV file for further analysis or record-keeping.")
+st.markdown("Download the filtered dataset as a CSV or Parquet file for further analysis or record-keeping.")
 
-# Read data from session state
-data = st.session_state.get('cleaned_data', None)
+# Read the typed dataset built at upload time
+dataset = get_dataset()
+data = dataset.frame if dataset is not None else None
 
 # Ensure the export functionality works even with incomplete or partially cleaned data
 if data is None or data.empty:
@@ -17,8 +18,35 @@ if data is None or data.empty:
 
 # Graceful feature skipping
 try:
-    # Update download button to use session state data
-    st.download_button("Download Filtered Data as CSV", data=data.to_csv(index=False).encode('utf-8'), file_name="filtered_data.csv", mime="text/csv")
+    # The Dashboard leaves its filters behind as a predicate; only the matching rows are serialized
+    filter_key, row_filter = st.session_state.get("active_filter", (None, RowFilter()))
+    if filter_key != st.session_state.get("data_key"):
+        row_filter = RowFilter()
+    apply_filter = st.checkbox(f"Apply Dashboard filters ({row_filter.describe()})", value=bool(row_filter),
+                               disabled=not row_filter, help="Set the date range and filters on the Dashboard page.")
+    if not apply_filter:
+        row_filter = RowFilter()
+    selection = row_filter.select(dataset)
+
+    columns = st.multiselect("Columns to export", options=list(data.columns), default=list(data.columns))
+    if not columns:
+        st.warning("Select at least one column to export.")
+        st.stop()
+    st.caption(f"{len(selection):,} of {len(dataset):,} rows, {len(columns)} of {len(data.columns)} columns.")
+
+    export_format = st.radio("Export format", ["CSV", "Parquet"], horizontal=True,
+                             help="Parquet keeps column types and is much smaller and faster to load for large datasets.")
+
+    compression = st.selectbox("Compression", export_compressions(export_format),
+                               help="Compressed files are smaller to download; zstd is the fastest to write.")
+
+    # The file is written in chunks only when the button is clicked, then reused until the data changes
+    file_name, mime = export_file_name("filtered_data", export_format, compression)
+    st.download_button(f"Download Filtered Data as {export_format}", file_name=file_name, mime=mime,
+                       data=lazy_export(lambda: selection.frame(columns),
+                                        lambda: f"{dataset.fingerprint}:{row_filter.key}:{columns}",
+                                        export_format, compression),
+                       on_click="ignore")
 except Exception as e:
     st.info(f"Export functionality couldn't be completed due to an error: {e}")
 
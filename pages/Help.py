@@ -1,6 +1,7 @@
 import streamlit as st
-from helper import show_sidebar_guide
-import requests
+from helper import show_sidebar_guide, lazy_import
+
+requests = lazy_import("requests")
 
 show_sidebar_guide()
 
@@ -29,7 +30,8 @@ with st.expander("Frequently Asked Questions"):
     st.markdown("Your file should include at least the following columns: **Order Date**, **Sales**, and **Profit**.")
 
     st.subheader("How is the forecast generated?")
-    st.markdown("We use the **Prophet** library to generate forecasts based on historical data.")
+    st.markdown("By default we use the **Prophet** library to generate forecasts based on historical data. "
+                "For quick looks, pick the **Fast** engine: seasonal naive, Holt-Winters smoothing, or a linear trend with seasonality.")
 
     st.subheader("Can I change the currency?")
     st.markdown("Yes, use the currency selector to convert values to your preferred currency.")
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from helper import ewma_scores, rolling_mad_scores
+
+SPIKE = 40
+
+
+def series(periods=60, seed=0):
+    """Two noisy columns around 100; only the first has a spike."""
+    values = 100 + np.random.default_rng(seed).normal(0, 2, size=(periods, 2))
+    values[SPIKE, 0] = 160
+    return values
+
+
+def test_rolling_mad_scores_against_the_preceding_window():
+    values = series()
+    scores, expected = rolling_mad_scores(values, window=12)
+    assert np.isnan(scores[:12]).all()
+    assert expected[30, 1] == pytest.approx(np.median(values[18:30, 1]))
+    assert scores[SPIKE, 0] > 10
+    assert np.nanmax(np.abs(scores[:, 1])) < 10
+
+
+def test_ewma_scores_leave_the_current_point_out():
+    values = series()
+    scores, expected = ewma_scores(values, window=12)
+    # The spike is scored against the history before it, so it stands out instead of pulling the mean up
+    assert expected[SPIKE, 0] == pytest.approx(100, abs=3)
+    assert scores[SPIKE, 0] > 10
+    assert np.nanmax(np.abs(scores[:, 1])) < 10
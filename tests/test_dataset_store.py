@@ -0,0 +1,49 @@
+import gc
+
+import pandas as pd
+
+from helper import DatasetStore, build_dataset
+
+COLUMN_MAP = {"Order Date": "Order Date", "Sales": "Sales", "Profit": "Profit"}
+
+
+def make_dataset():
+    return build_dataset(pd.DataFrame({"Order Date": ["2020-01-01"], "Sales": [1.0], "Profit": [0.1]}), COLUMN_MAP)
+
+
+def test_acquire_builds_once_and_release_evicts_at_zero():
+    store, builds = DatasetStore(), []
+
+    def build():
+        builds.append(1)
+        return make_dataset()
+
+    first = store.acquire("key", build)
+    second = store.acquire("key", build)
+    assert len(builds) == 1
+    assert first.dataset is second.dataset
+    assert store._entries["key"][1] == 2
+
+    del first
+    gc.collect()
+    assert store._entries["key"][1] == 1
+    del second
+    gc.collect()
+    assert "key" not in store._entries
+
+    store.acquire("key", build)
+    assert len(builds) == 2
+
+
+def test_failed_build_is_retried():
+    store = DatasetStore()
+
+    def fail():
+        raise ValueError("bad file")
+
+    try:
+        store.acquire("key", fail)
+    except ValueError:
+        pass
+    assert "key" not in store._entries
+    assert store.acquire("key", make_dataset).dataset is not None
@@ -0,0 +1,33 @@
+import numpy as np
+
+from helper import lttb_indices, minmax_indices
+
+
+def spiky(size=10_000):
+    y = np.sin(np.linspace(0, 20, size))
+    y[4_321] = 50.0
+    y[7_777] = -50.0
+    return y
+
+
+def test_lttb_keeps_ends_and_spikes():
+    y = spiky()
+    picked = lttb_indices(np.arange(len(y)), y, points=200)
+    assert len(picked) == 200
+    assert picked[0] == 0 and picked[-1] == len(y) - 1
+    assert np.all(np.diff(picked) > 0)
+    assert {4_321, 7_777} <= set(picked)
+
+
+def test_minmax_keeps_extremes():
+    y = spiky()
+    picked = minmax_indices(y, points=200)
+    assert len(picked) <= 200
+    assert np.all(np.diff(picked) > 0)
+    assert {4_321, 7_777} <= set(picked)
+
+
+def test_short_series_are_untouched():
+    y = np.arange(10.0)
+    np.testing.assert_array_equal(lttb_indices(np.arange(10), y, points=50), np.arange(10))
+    np.testing.assert_array_equal(minmax_indices(y, points=50), np.arange(10))
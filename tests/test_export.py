@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from helper import RowFilter, build_dataset, export_compressions, export_file
+
+COLUMN_MAP = {"Order Date": "Order Date", "Sales": "Sales", "Profit": "Profit"}
+
+
+def make_rows(size=1_000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "Order Date": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 365, size), unit="D"),
+        "Region": rng.choice(["East", "West"], size),
+        "Sales": rng.random(size) * 100,
+        "Profit": rng.random(size) * 10,
+    })
+
+
+@pytest.mark.parametrize("fmt, compression", [
+    *[("CSV", name) for name in export_compressions("CSV")],
+    *[("Parquet", name) for name in export_compressions("Parquet")],
+])
+def test_filtered_export_round_trips(tmp_path, fmt, compression):
+    rows = make_rows()
+    row_filter = RowFilter(start="2020-03-01", end="2020-08-31", filters={"Region": ["West"]})
+    expected = row_filter.select(build_dataset(rows, COLUMN_MAP)).frame(list(rows.columns)).reset_index(drop=True)
+
+    # Small chunks so the file is written in several slices
+    path = export_file(expected, row_filter.key, fmt, compression, chunk_rows=97, directory=tmp_path)
+    if fmt == "CSV":
+        read = pd.read_csv(path, parse_dates=["Order Date"])
+    else:
+        read = pd.read_parquet(path)
+
+    assert len(read) == len(expected) > 0
+    assert (read["Region"] == "West").all()
+    assert read["Order Date"].between("2020-03-01", "2020-08-31").all()
+    np.testing.assert_allclose(read["Sales"], expected["Sales"])
+    assert export_file(lambda: pytest.fail("cached export was rebuilt"), row_filter.key, fmt, compression, directory=tmp_path) == path
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from helper import build_dataset
+
+COLUMN_MAP = {"Order Date": "Order Date", "Sales": "Sales", "Profit": "Profit"}
+
+
+def make_rows(size=500, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.Series(pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 365, size), unit="D"))
+    dates[rng.random(size) < 0.05] = pd.NaT
+    return pd.DataFrame({
+        "Order Date": dates,
+        "Region": pd.Series(rng.choice(["East", "West", "South", None], size), dtype="object"),
+        "Category": rng.choice(["Furniture", "Technology"], size),
+        "Sales": rng.random(size) * 100,
+        "Profit": rng.random(size) * 10,
+    })
+
+
+@pytest.mark.parametrize("start, end, filters", [
+    (None, None, {}),
+    ("2020-03-01", "2020-06-30", {}),
+    (None, None, {"Region": ["East", "West"]}),
+    ("2020-02-01", None, {"Region": ["South"], "Category": ["Furniture"]}),
+    (None, "2020-05-15", {"Region": ["Nowhere"]}),
+])
+def test_select_matches_pandas_mask(start, end, filters):
+    rows = make_rows()
+    engine = build_dataset(rows, COLUMN_MAP).filter_engine
+
+    mask = pd.Series(True, index=rows.index)
+    if start is not None:
+        mask &= rows["Order Date"] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= rows["Order Date"] < pd.Timestamp(end) + pd.Timedelta(days=1)
+    for name, values in filters.items():
+        mask &= rows[name].isin(values)
+
+    np.testing.assert_array_equal(engine.select(start, end, filters).positions, np.flatnonzero(mask))
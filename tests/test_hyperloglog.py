@@ -0,0 +1,21 @@
+import pandas as pd
+import pytest
+
+from helper import HyperLogLog
+
+
+@pytest.mark.parametrize("distinct", [1, 100, 5_000, 200_000])
+def test_count_within_error_bound(distinct):
+    sketch = HyperLogLog(p=12)
+    sketch.update(pd.Series(range(distinct)).astype(str))
+    # About 1.6% standard error at p=12; three of those keeps the test deterministic and meaningful
+    assert sketch.count() == pytest.approx(distinct, rel=0.05)
+
+
+def test_repeats_and_nulls_do_not_count():
+    sketch = HyperLogLog()
+    values = pd.Series([f"customer-{i}" for i in range(1_000)] + [None] * 50)
+    sketch.update(values)
+    sketch.update(values)
+    assert sketch.count() == pytest.approx(1_000, rel=0.05)
+    assert HyperLogLog().count() == 0
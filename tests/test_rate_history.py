@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+
+from helper import RateHistory
+
+
+def test_rates_on_is_an_as_of_lookup():
+    rates = pd.DataFrame(
+        {"EUR": [0.9, np.nan, 0.8], "INR": [80.0, 82.0, 83.0]},
+        index=pd.to_datetime(["2020-01-10", "2020-01-01", "2020-01-20"]),
+    )
+    history = RateHistory(rates)
+    dates = pd.to_datetime(["2019-12-25", "2020-01-01", "2020-01-15", "2020-01-20", "2020-02-01", None])
+
+    # Before the first row takes the first rate, missing dates the last; gaps are forward filled
+    np.testing.assert_allclose(history.rates_on(dates, "INR"), [82.0, 82.0, 80.0, 83.0, 83.0, 83.0])
+    np.testing.assert_allclose(history.rates_on(dates, "EUR"), [0.9, 0.9, 0.9, 0.8, 0.8, 0.8])
+    np.testing.assert_allclose(history.rates_on(dates, "USD"), 1.0)
+    assert "EUR" in history and "GBP" not in history
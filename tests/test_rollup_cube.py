@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from helper import RollupCube, build_dataset
+
+COLUMN_MAP = {"Order Date": "Order Date", "Sales": "Sales", "Profit": "Profit"}
+
+
+def make_rows(dates, regions, sales):
+    return pd.DataFrame({
+        "Order Date": pd.to_datetime(dates),
+        "Region": pd.Series(regions, dtype="object"),
+        "Category": "Furniture",
+        "Sales": sales,
+        "Profit": [value / 10 for value in sales],
+    })
+
+
+def test_append_keeps_rows_with_missing_keys():
+    base = make_rows(["2020-01-01", "2020-01-02"], ["East", np.nan], [10.0, 20.0])
+    extra = make_rows(["2020-01-02", "2020-01-03", None], [np.nan, "West", "East"], [5.0, 7.0, 3.0])
+
+    cube = RollupCube(build_dataset(base, COLUMN_MAP))
+    cube.append(extra)
+    rebuilt = RollupCube(build_dataset(pd.concat([base, extra], ignore_index=True), COLUMN_MAP))
+
+    totals = cube.query()
+    assert totals["Orders"] == 5
+    assert totals["Sales_sum"] == pytest.approx(45.0)
+    assert totals["Profit_sum"] == pytest.approx(4.5)
+    pd.testing.assert_series_equal(totals, rebuilt.query())
+
+
+def test_append_merges_cells_with_missing_region():
+    base = make_rows(["2020-01-02"], [np.nan], [20.0])
+    cube = RollupCube(build_dataset(base, COLUMN_MAP))
+    cube.append(make_rows(["2020-01-02"], [np.nan], [5.0]))
+
+    by_region = cube.query(by=["Region"])
+    assert len(cube.cells) == 1
+    assert by_region["Orders"].sum() == 2
+    assert by_region["Sales_max"].max() == pytest.approx(20.0)
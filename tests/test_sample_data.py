@@ -0,0 +1,6 @@
+from helper import SAMPLE_COLUMN_MAP, read_sample_data, upload_column_map
+
+
+def test_sample_column_map_matches_upload_mapping():
+    # The Upload page remaps the sample with upload_column_map; any difference builds a second Dataset
+    assert upload_column_map(read_sample_data()) == SAMPLE_COLUMN_MAP
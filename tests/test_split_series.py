@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+
+from helper import build_dataset, split_series
+
+COLUMN_MAP = {"Order Date": "Order Date", "Sales": "Sales", "Profit": "Profit"}
+
+
+def test_members_span_the_full_range_and_sparse_ones_are_skipped():
+    dates = pd.date_range("2020-01-01", periods=30, freq="D")
+    rows = pd.DataFrame({
+        "Order Date": list(dates[::2]) + [dates[3], dates[9]],
+        "Region": ["East"] * 15 + ["West"] * 2,
+        "Sales": [10.0] * 15 + [500.0, 700.0],
+        "Profit": 1.0,
+    })
+    dataset = build_dataset(rows, COLUMN_MAP)
+
+    series, skipped = split_series(dataset.rollup("Region"), "Region", "Sales", min_days=5)
+    assert skipped == {"West": 2}
+    east = series["East"]
+    assert list(east.columns) == ["ds", "y"]
+    assert east["ds"].tolist() == list(dates[:29])
+    assert east["y"].sum() == pytest.approx(150.0)
+    assert (east["y"] == 0).sum() == 14
+
+    # Largest totals first, before the sparse ones are set aside
+    series, skipped = split_series(dataset.rollup("Region"), "Region", "Sales", top=1, min_days=5)
+    assert series == {} and skipped == {"West": 2}